@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Runs base captures without the setup screens, for scripts and sensors.
+# Settings come from the options below or a config file, and the captures
+# can be scheduled into daily windows:
+#
+#   sudo python3 capdaemon.py -i eth0 -p /var/captures -n sensor1 --runperiod 0:1:0
+#   sudo python3 capdaemon.py -c sensor.ini
+#
+# The config file has the settings of the setup screens in a [capture]
+# section, and the capture windows in a [schedule] section:
+#
+#   [capture]
+#   Interface = eth0
+#   BaseCapPath = /var/captures
+#   BaseFileName = sensor1
+#   RotateSize = 100
+#
+#   [schedule]
+#   windows = 08:00-09:00, 22:30-01:00
+#
+# With windows, it keeps running and captures during each window into a
+# file named after the window start, until it is stopped (^C or kill).
+
+# Internal modules
+import argparse
+import configparser
+from datetime import datetime, timedelta
+import os
+import signal
+import sys
+import threading
+
+# Downloaded modules
+from termcolor import colored
+
+# File imports
+from netreader import basesettings as defaults
+import scapyreader
+
+#---------------------------------[Globals]------------------------------------
+# Settings that have their own option, by option name
+OPTIONS = {
+    'interface':    'Interface',
+    'path':         'BaseCapPath',
+    'name':         'BaseFileName',
+    'runtime':      'RunTime',
+    'runperiod':    'RunPeriod',
+    'filter':       'CapFilter'
+}
+
+#--------------------------------[Functions]-----------------------------------
+# Reads the command-line options
+def parse_args():
+    parser = argparse.ArgumentParser(description="Runs base captures without the setup screens.")
+    parser.add_argument('-c', '--config', help="config file with the settings and schedule")
+    parser.add_argument('-i', '--interface', help="interfaces to capture, seperated by spaces")
+    parser.add_argument('-p', '--path', help="folder the captures are saved in")
+    parser.add_argument('-n', '--name', help="file name of the captures")
+    parser.add_argument('--runtime', help="time of day the capture ends (hh:mm)")
+    parser.add_argument('--runperiod', help="how long the capture runs (d:h:m)")
+    parser.add_argument('-f', '--filter', help="capture filter (tcpdump syntax)")
+    parser.add_argument('-w', '--window', action='append', default=[],
+                        help="daily capture window (hh:mm-hh:mm), can be repeated")
+    parser.add_argument('-s', '--set', action='append', default=[], metavar='SETTING=VALUE',
+                        help="any other setting of the setup screens, can be repeated")
+    parser.add_argument('--once', action='store_true',
+                        help="only capture the next window, then exit")
+
+    return parser.parse_args()
+
+# Reads the settings and capture windows of a config file
+def load_config(path):
+    config = configparser.ConfigParser()
+    # Setting names are case sensitive
+    config.optionxform = str
+    if not config.read(path):
+        error("Can't read config file " + path)
+
+    settings = dict(config['capture']) if config.has_section('capture') else {}
+    windows = []
+    if config.has_section('schedule'):
+        windows = [win.strip() for win in config['schedule'].get('windows', '').split(',')
+                   if win.strip() != '']
+
+    return settings, windows
+
+# Converts a hh:mm-hh:mm capture window into its start and end times
+def parse_window(window):
+    try:
+        start, end = window.split('-')
+        start = datetime.strptime(start.strip(), "%H:%M")
+        end = datetime.strptime(end.strip(), "%H:%M")
+    except ValueError:
+        error("Invalid capture window " + window + ", expected hh:mm-hh:mm")
+
+    return (start.hour, start.minute), (end.hour, end.minute)
+
+# Finds the next capture window that hasn't ended yet. Returns its start
+# (now, if it has already started) and end. Windows ending before they
+# start run over midnight.
+def next_window(windows, now):
+    found = None
+    for (start_h, start_m), (end_h, end_m) in windows:
+        for days in (-1, 0, 1):
+            start = (now + timedelta(days=days)).replace(hour=start_h, minute=start_m,
+                                                        second=0, microsecond=0)
+            end = start.replace(hour=end_h, minute=end_m)
+            if end <= start:
+                end += timedelta(days=1)
+
+            if end > now and (found is None or start < found[0]):
+                found = (start, end)
+
+    start, end = found
+    return max(start, now), end
+
+# Checks the settings needed to start a capture
+def check_settings(settings, scheduled):
+    if settings['Interface'] == '':
+        error("No interface given")
+    if settings['BaseCapPath'] == '' or not os.path.isdir(settings['BaseCapPath']):
+        error("Capture path " + settings['BaseCapPath'] + " doesn't exist")
+    if settings['BaseFileName'] == '':
+        error("No capture file name given")
+    if not scheduled and settings['RunTime'] == '' and settings['RunPeriod'] == '':
+        error("No run time, run period or capture window given")
+
+    if settings['CapFilter'] != '':
+        valid, program = scapyreader.check_filter(settings['Interface'].split()[0],
+                                                  settings['CapFilter'])
+        if valid == False:
+            error("Invalid capture filter: " + "\n".join(program))
+
+# Prints an error and exits
+def error(message):
+    print(colored("[*] Error: " + message, 'red'))
+    sys.exit(1)
+
+# Runs one base capture with the given settings, its summary says where
+# it was saved. Returns the capture.
+def run_capture(settings):
+    print(colored("[" + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "] Starting capture on " +
+                  settings['Interface'], 'green'))
+
+    return scapyreader.BaseCap(settings)
+
+#----------------------------------[Main]--------------------------------------
+def __Main():
+    args = parse_args()
+
+    if os.geteuid() != 0:
+        error("Please run as root, capturing needs raw sockets")
+
+    # Settings start from the defaults of the setup screens, then the
+    # config file, then the options
+    settings = dict(defaults)
+    windows = []
+    if args.config is not None:
+        config, windows = load_config(args.config)
+        settings.update(config)
+
+    for option, name in OPTIONS.items():
+        if getattr(args, option) is not None:
+            settings[name] = getattr(args, option)
+    for setting in args.set:
+        name, sep, value = setting.partition('=')
+        if sep == '' or name not in defaults:
+            error("Unknown setting " + setting)
+        settings[name] = value
+    windows += args.window
+
+    # There is no terminal to draw the dashboard on
+    if settings['DisplayMode'] == 'Dashboard':
+        settings['DisplayMode'] = 'None'
+
+    windows = [parse_window(window) for window in windows]
+    check_settings(settings, len(windows) > 0)
+
+    if not windows:
+        run_capture(settings)
+        return
+
+    # Stops the daemon between windows. During a capture the signals stop
+    # the capture, which then ends the daemon too.
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+        signal.signal(sig, lambda signum, frame: stop.set())
+
+    while not stop.is_set():
+        start, end = next_window(windows, datetime.now())
+
+        wait = (start - datetime.now()).total_seconds()
+        if wait > 0:
+            print(colored("Next capture window: " + start.strftime("%Y-%m-%d %H:%M") + " to " +
+                          end.strftime("%Y-%m-%d %H:%M"), 'blue'))
+            if stop.wait(wait):
+                break
+
+        # Each window is saved under the time it started
+        window = dict(settings)
+        window['RunTime'] = end.strftime("%H:%M")
+        window['RunPeriod'] = ''
+        window['BaseFileName'] = settings['BaseFileName'] + '_' + start.strftime("%Y%m%d-%H%M")
+
+        cap = run_capture(window)
+        if cap.stop_event.is_set() or args.once:
+            break
+
+    print(colored("Capture daemon stopped.", 'green'))
+
+#-----------------------------------[Run]--------------------------------------
+if __name__ == '__main__':
+    __Main()
+#------------------------------------------------------------------------------
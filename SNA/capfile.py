@@ -0,0 +1,609 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import bisect
+from collections import deque
+import gzip
+import heapq
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+# Downloaded modules
+# zstandard is only needed for zstd compressed captures
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#---------------------------------[Globals]------------------------------------
+# Pcap global header: magic, major, minor, thiszone, sigfigs, snaplen, linktype
+PCAP_HEADER = struct.Struct('<IHHiIII')
+# Pcap record header: ts_sec, ts_usec, incl_len, orig_len
+PCAP_RECORD = struct.Struct('<IIII')
+
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_SNAPLEN = 262144
+DLT_EN10MB = 1
+
+# File extension added to compressed captures, by Compression setting
+COMPRESS_EXT = {
+    '':     '',
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+# Compression levels favour speed, the capture box has little CPU to spare
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+
+# Number of flushed buffers that may wait for the compressor thread
+COMPRESS_QUEUE = 64
+
+# Default flush policy in the packets:bytes:seconds format. The buffer is
+# written out as soon as any one of the three thresholds is reached.
+DEFAULT_FLUSH = '512:1048576:1'
+
+# Upper bounds, in microseconds, of the buckets of the flush latency
+# histogram. The last bucket holds every flush slower than that.
+LATENCY_BOUNDS = (10, 100, 1000, 10000, 100000, 1000000)
+
+# Time index kept next to each capture file. Starts with INDEX_MAGIC, then
+# one entry of ts_sec, ts_usec, file offset and packet number for the first
+# packet of every second and at least every INDEX_PACKETS packets. Offsets
+# are in the uncompressed capture.
+INDEX_MAGIC = b'PCAPIDX1'
+INDEX_RECORD = struct.Struct('<IIQQ')
+INDEX_PACKETS = 1000
+
+#--------------------------------[Functions]-----------------------------------
+# Converts the packets:bytes:seconds format into packets, bytes and seconds
+def parse_flush(FlushPolicy):
+    if FlushPolicy == '':
+        FlushPolicy = DEFAULT_FLUSH
+
+    pol = FlushPolicy.split(':')
+    packets = int(pol[0])
+    nbytes = int(pol[1])
+    seconds = float(pol[2])
+
+    return packets, nbytes, seconds
+
+# Splits a packet timestamp into the seconds and microseconds of a record
+def split_ts(timestamp):
+    sec = int(timestamp)
+    usec = int(round((timestamp - sec) * 1000000))
+    if usec >= 1000000:
+        sec += 1
+        usec -= 1000000
+
+    return sec, usec
+
+# Builds the file name of segment num of a rotating capture
+def segment_path(stem, num, ext=''):
+    return stem + '_' + str(num).zfill(4) + '.pcap' + ext
+
+# Strips the .pcap and any compression extension off a capture file name
+def capture_stem(path):
+    for ext in COMPRESS_EXT.values():
+        if ext != '' and path.endswith(ext):
+            path = path[:-len(ext)]
+    if path.endswith('.pcap'):
+        path = path[:-len('.pcap')]
+    return path
+
+# Builds the file name of the time index of a capture file
+def index_path(path):
+    return capture_stem(path) + '.idx'
+
+# Reads the time index of a capture file as a list of (ts_sec, ts_usec,
+# offset, packet number). Returns None if the capture has no index.
+def read_index(path):
+    try:
+        with open(index_path(path), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if not data.startswith(INDEX_MAGIC):
+        return None
+
+    # A partly written last entry is left out
+    end = len(INDEX_MAGIC) + (len(data) - len(INDEX_MAGIC)) // INDEX_RECORD.size * INDEX_RECORD.size
+    return list(INDEX_RECORD.iter_unpack(data[len(INDEX_MAGIC):end]))
+
+# Builds the file name of the metadata saved with a capture file
+def meta_path(path):
+    return capture_stem(path) + '.meta.json'
+
+# Reads the metadata saved with a capture file, such as its sampling.
+# Captures without metadata give an empty dictionary.
+def read_meta(path):
+    try:
+        with open(meta_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Opens a capture file for reading, decompressing gzip and zstd captures on
+# the fly. The compression is recognised from the first bytes of the file.
+def open_capture(path):
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    if magic == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            raise ValueError(path + " is zstd compressed, the zstandard module is required")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+# Merges the captures of several interfaces into one timestamp ordered pcap.
+# Each entry of sources is the list of files (segments) of one interface, in
+# capture order. Files that are empty or not captures (an interface that
+# captured nothing) are skipped. Returns the number of packets merged, or
+# None if the interfaces do not share a link type.
+def merge_pcaps(sources, output, compress='', index=0, meta=None):
+    readers = []
+    for files in sources:
+        opened = []
+        for path in files:
+            try:
+                opened.append(CapReader(path))
+            except (OSError, ValueError):
+                pass
+        readers.append(opened)
+
+    linktypes = set(r.linktype for files in readers for r in files)
+    if len(linktypes) > 1:
+        for files in readers:
+            for r in files:
+                r.close()
+        return None
+
+    linktype = linktypes.pop() if linktypes else DLT_EN10MB
+    writer = CapWriter(output, linktype=linktype, compress=compress, index=index, meta=meta)
+    streams = [itertools.chain(*files) for files in readers]
+
+    count = 0
+    for sec, usec, wirelen, data in heapq.merge(*streams, key=lambda rec: (rec[0], rec[1])):
+        writer.write(data, sec + usec / 1000000, wirelen)
+        count += 1
+    writer.close()
+
+    for files in readers:
+        for r in files:
+            r.close()
+
+    return count
+
+#---------------------------------[Classes]------------------------------------
+# Streams the data written to a capture file through gzip or zstd on its own
+# thread. Both compressors release the GIL, so compression runs alongside
+# the capture instead of in the writer's flush. Used by CapWriter in place
+# of a plain file object.
+class CapCompressor(threading.Thread):
+    def __init__(self, path, compress):
+        threading.Thread.__init__(self, name='compressor', daemon=True)
+        self.queue = queue.Queue(COMPRESS_QUEUE)
+
+        # Checked before the file is created, so a missing module doesn't
+        # leave an empty capture behind
+        if compress == 'zstd':
+            if zstandard is None:
+                raise ValueError("the zstandard module is required for zstd compression")
+            self.comp = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            # wbits of 31 produces a gzip stream
+            self.comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+        self.f = open(path, 'ab')
+        self.start()
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            self.f.write(self.comp.compress(data))
+
+        self.f.write(self.comp.flush())
+        self.f.close()
+
+    # Hands data to the compressor thread. Blocks if it falls far behind.
+    def write(self, data):
+        self.queue.put(data)
+
+    # Compressed output is flushed by the thread as it goes
+    def flush(self):
+        pass
+
+    # Size of the compressed file, for appending to an existing capture
+    def tell(self):
+        return self.f.tell()
+
+    # Finishes the compressed stream and closes the file
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+# Long-lived pcap writer. Keeps a single handle open on the capture file and
+# batches records in a bounded buffer, so a packet costs a struct.pack and a
+# list append instead of an open/read header/close cycle.
+class CapWriter:
+    def __init__(self, path, FlushPolicy=DEFAULT_FLUSH, linktype=None,
+                 max_size=0, max_time=0, keep=0, on_close=None, snaplen=0, compress='',
+                 index=0, meta=None):
+        self.linktype = linktype
+        # Compressed captures get a .gz or .zst extension. Segment sizes are
+        # counted before compression.
+        self.compress = compress
+        self.ext = COMPRESS_EXT[compress]
+        # Records are cut to snaplen bytes, while orig_len keeps the size
+        # of the frame on the wire. 0 stores full frames.
+        self.snaplen = snaplen
+        self.max_pkts, self.max_bytes, self.max_secs = parse_flush(FlushPolicy)
+        # Packets between entries of the time index, 0 writes no index
+        self.index = index
+        self.idx_buffer = []
+        # Saved as JSON next to each capture file
+        self.meta = meta
+
+        # Segment rotation. A max_size (bytes) or max_time (seconds) of 0
+        # disables that threshold, keep of 0 retains every segment.
+        self.max_size = max_size
+        self.max_time = max_time
+        self.keep = keep
+        self.on_close = on_close
+        self.rotating = max_size > 0 or max_time > 0
+        self.stem = capture_stem(path)
+        self.seg_num = 0
+        self.segments = []
+
+        self.buffer = []
+        self.buf_bytes = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.pkts_written = 0
+        self.bytes_written = 0
+
+        # Time taken by each write of the buffer to the file
+        self.latency = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.latency_max = 0
+
+        if self.rotating:
+            self.__OpenSegment()
+        else:
+            self.path = path + self.ext
+            self.__Open()
+
+    # Opens the current file, appending if it already holds a capture
+    def __Open(self):
+        if self.compress != '':
+            self.f = CapCompressor(self.path, self.compress)
+        else:
+            self.f = open(self.path, 'ab')
+        self.header_done = self.f.tell() > 0
+        self.seg_bytes = self.f.tell()
+        self.seg_start = time.monotonic()
+        self.seg_pkts = 0
+
+        if self.meta is not None:
+            with open(meta_path(self.path), 'w') as f:
+                json.dump(self.meta, f, indent=4)
+
+        if self.index > 0:
+            self.idx = open(index_path(self.path), 'ab')
+            if self.idx.tell() == 0:
+                self.idx.write(INDEX_MAGIC)
+            self.idx_sec = None
+
+    # Closes the current file and its index
+    def __Close(self):
+        self.f.close()
+        if self.index > 0:
+            self.idx.close()
+
+    # Removes a capture file with its index and metadata
+    def __Remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        if self.index > 0 and os.path.exists(index_path(path)):
+            os.remove(index_path(path))
+        if self.meta is not None and os.path.exists(meta_path(path)):
+            os.remove(meta_path(path))
+
+    # Opens the next sequentially numbered segment of a rotating capture
+    def __OpenSegment(self):
+        self.seg_num += 1
+        self.path = segment_path(self.stem, self.seg_num, self.ext)
+        self.__Open()
+
+    # Closes the current segment, drops the oldest ones past the number to
+    # keep and opens the next one. Caller must hold the lock.
+    def __Rotate(self):
+        self.__Flush()
+        self.__Close()
+        self.segments.append(self.path)
+        if self.on_close is not None:
+            self.on_close(self.path)
+
+        while self.keep > 0 and len(self.segments) >= self.keep:
+            old = self.segments.pop(0)
+            self.__Remove(old)
+
+        self.__OpenSegment()
+
+    # Checks whether a record of nbytes still fits in the current segment
+    def __SegmentFull(self, nbytes):
+        size = self.seg_bytes + self.buf_bytes
+        if size == 0:
+            return False
+        if not self.header_done:
+            size += PCAP_HEADER.size
+        if self.max_size > 0 and size + nbytes > self.max_size:
+            return True
+        if self.max_time > 0 and time.monotonic() - self.seg_start >= self.max_time:
+            return True
+        return False
+
+    # Buffers one record and flushes once a threshold of the policy is hit
+    def write(self, raw, timestamp, wirelen=None):
+        if wirelen is None:
+            wirelen = len(raw)
+        if self.snaplen > 0 and len(raw) > self.snaplen:
+            raw = raw[:self.snaplen]
+        sec, usec = split_ts(timestamp)
+
+        with self.lock:
+            if self.rotating and self.__SegmentFull(PCAP_RECORD.size + len(raw)):
+                self.__Rotate()
+
+            if self.index > 0 and (sec != self.idx_sec or self.seg_pkts % self.index == 0):
+                offset = self.seg_bytes + self.buf_bytes
+                if not self.header_done:
+                    offset += PCAP_HEADER.size
+                self.idx_buffer.append(INDEX_RECORD.pack(sec, usec, offset, self.seg_pkts))
+                self.idx_sec = sec
+            self.seg_pkts += 1
+
+            self.buffer.append(PCAP_RECORD.pack(sec, usec, len(raw), wirelen))
+            self.buffer.append(raw)
+            self.buf_bytes += PCAP_RECORD.size + len(raw)
+            self.pkts_written += 1
+
+            if (len(self.buffer) >= self.max_pkts * 2 or
+                    self.buf_bytes >= self.max_bytes or
+                    time.monotonic() - self.last_flush >= self.max_secs):
+                self.__Flush()
+
+    # Flushes the buffer if the time threshold passed without any new packet
+    # and closes a segment that outlived its duration
+    def poll(self):
+        with self.lock:
+            if self.rotating and self.__SegmentFull(0):
+                self.__Rotate()
+            elif self.buffer and time.monotonic() - self.last_flush >= self.max_secs:
+                self.__Flush()
+
+    # Writes out anything still buffered
+    def flush(self):
+        with self.lock:
+            self.__Flush()
+
+    # Flushes and closes the capture file. A capture that got no packets
+    # is still given its header, so it can be read back.
+    def close(self):
+        with self.lock:
+            self.__Flush()
+            if self.rotating and self.seg_bytes == 0 and self.segments:
+                # Nothing arrived since the last rotation
+                self.__Close()
+                self.__Remove(self.path)
+                return
+
+            if not self.header_done:
+                self.__Header()
+            self.__Close()
+            if self.rotating:
+                self.segments.append(self.path)
+                if self.on_close is not None:
+                    self.on_close(self.path)
+
+    # Writes the pcap global header. Caller must hold the lock.
+    def __Header(self):
+        if self.linktype is None:
+            self.linktype = DLT_EN10MB
+        self.f.write(PCAP_HEADER.pack(PCAP_MAGIC, 2, 4, 0, 0,
+                                      self.snaplen or PCAP_SNAPLEN, self.linktype))
+        self.header_done = True
+        self.seg_bytes += PCAP_HEADER.size
+
+    # Writes the buffered records to the file. Caller must hold the lock.
+    def __Flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+
+        start = time.perf_counter()
+        if not self.header_done:
+            self.__Header()
+
+        self.f.write(b''.join(self.buffer))
+        self.f.flush()
+
+        # The index is written after the records so it never points past
+        # the end of the capture
+        if self.idx_buffer:
+            self.idx.write(b''.join(self.idx_buffer))
+            self.idx.flush()
+            self.idx_buffer = []
+
+        usecs = int((time.perf_counter() - start) * 1000000)
+        self.latency[bisect.bisect_left(LATENCY_BOUNDS, usecs)] += 1
+        self.latency_max = max(self.latency_max, usecs)
+
+        self.bytes_written += self.buf_bytes
+        self.seg_bytes += self.buf_bytes
+        self.buffer = []
+        self.buf_bytes = 0
+
+# Pre-trigger ring placed in front of a CapWriter. Records are kept in
+# memory, up to the last max_secs seconds and max_bytes bytes (0 for no
+# limit), instead of being written. When trigger() is called the ring is
+# written out and records go straight to the writer for the next post
+# seconds, after which they are kept in memory again.
+class CapRing:
+    def __init__(self, writer, max_secs=0, max_bytes=0, post=0):
+        self.writer = writer
+        self.max_secs = max_secs
+        self.max_bytes = max_bytes
+        self.post = post
+
+        self.records = deque()
+        self.buf_bytes = 0
+        self.until = None
+        self.lock = threading.Lock()
+
+        self.triggers = 0
+        self.dumped = 0
+
+    # Link type of the capture, kept by the writer
+    @property
+    def linktype(self):
+        return self.writer.linktype
+
+    @linktype.setter
+    def linktype(self, linktype):
+        self.writer.linktype = linktype
+
+    # Writes the record while triggered, otherwise adds it to the ring and
+    # drops the records that fell out of it. Records are copied, as a ring
+    # capture hands over views that are only valid until its next block.
+    def write(self, raw, timestamp, wirelen=None):
+        with self.lock:
+            if self.until is not None:
+                if time.monotonic() < self.until:
+                    self.writer.write(raw, timestamp, wirelen)
+                    return
+                self.until = None
+
+            if wirelen is None:
+                wirelen = len(raw)
+            if self.writer.snaplen > 0:
+                raw = raw[:self.writer.snaplen]
+            self.records.append((bytes(raw), timestamp, wirelen))
+            self.buf_bytes += len(raw)
+
+            records = self.records
+            while len(records) > 1 and (
+                    (self.max_bytes > 0 and self.buf_bytes > self.max_bytes) or
+                    (self.max_secs > 0 and timestamp - records[0][1] > self.max_secs)):
+                self.buf_bytes -= len(records.popleft()[0])
+
+    # Writes out the ring and starts (or extends) the post-trigger time.
+    # Returns the number of records written from memory, or None if it
+    # was already triggered.
+    def trigger(self):
+        with self.lock:
+            armed = self.until is None or time.monotonic() >= self.until
+            self.until = time.monotonic() + self.post
+            if not armed:
+                return None
+
+            self.triggers += 1
+            count = len(self.records)
+            for raw, timestamp, wirelen in self.records:
+                self.writer.write(raw, timestamp, wirelen)
+            self.writer.flush()
+
+            self.dumped += count
+            self.records.clear()
+            self.buf_bytes = 0
+            return count
+
+    def flush(self):
+        self.writer.flush()
+
+# Sequential pcap reader. Iterating yields (ts_sec, ts_usec, orig_len, data)
+# for each record without any dissection. Both byte orders and nanosecond
+# pcaps are read, timestamps are always given in microseconds.
+class CapReader:
+    def __init__(self, path):
+        self.path = path
+        self.f = open_capture(path)
+
+        header = self.f.read(PCAP_HEADER.size)
+        if len(header) < PCAP_HEADER.size:
+            raise ValueError(path + " is not a pcap file")
+
+        magic = struct.unpack('<I', header[:4])[0]
+        if magic in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+            endian = '<'
+        else:
+            endian = '>'
+            magic = struct.unpack('>I', header[:4])[0]
+            if magic not in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+                raise ValueError(path + " is not a pcap file")
+
+        self.nano = magic == PCAP_MAGIC_NSEC
+        fields = struct.unpack(endian + 'IHHiIII', header)
+        self.snaplen = fields[5]
+        self.linktype = fields[6]
+        self.record = struct.Struct(endian + 'IIII')
+
+        # Offset of the record last read, in the uncompressed capture
+        self.offset = PCAP_HEADER.size
+        self.pos = PCAP_HEADER.size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.offset = self.pos
+        head = self.f.read(self.record.size)
+        if len(head) < self.record.size:
+            raise StopIteration
+
+        sec, frac, incl_len, orig_len = self.record.unpack(head)
+        data = self.f.read(incl_len)
+        if len(data) < incl_len:
+            # Record cut short, e.g. a capture still being written
+            raise StopIteration
+        self.pos += self.record.size + incl_len
+
+        if self.nano:
+            frac //= 1000
+        return sec, frac, orig_len, data
+
+    # Moves to the last indexed packet at or before timestamp, so reading a
+    # time range doesn't have to go through the whole capture. Records
+    # before timestamp may still follow and are left to the caller to skip.
+    # Returns the number of the next packet in the file, or None when the
+    # index has nothing to skip to.
+    def seek_time(self, timestamp):
+        entries = read_index(self.path)
+        if not entries:
+            return None
+
+        times = [sec + usec / 1000000 for sec, usec, offset, num in entries]
+        i = bisect.bisect_right(times, timestamp) - 1
+        if i < 0 or entries[i][2] <= self.pos:
+            return None
+
+        self.f.seek(entries[i][2])
+        self.pos = entries[i][2]
+        return entries[i][3]
+
+    def close(self):
+        self.f.close()
+
+#------------------------------------------------------------------------------
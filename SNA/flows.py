@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import random
+import struct
+import time
+import zlib
+
+#---------------------------------[Globals]------------------------------------
+# Sampling modes, as saved in the SampleMode setting
+SAMPLE_MODES = ('None', 'Count', 'Random', 'Flow')
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86dd
+ETH_VLAN = (0x8100, 0x88a8)
+
+# IP protocols with source and destination ports: TCP, UDP and SCTP
+PORT_PROTOS = (6, 17, 132)
+
+# Most flows tracked by the flow cutoff, and the seconds after which an
+# idle flow starts over
+FLOW_TABLE_SIZE = 65536
+FLOW_TIMEOUT = 120
+
+#--------------------------------[Functions]-----------------------------------
+# Builds the flow key of an Ethernet frame from the IP protocol and both
+# address:port endpoints. The endpoints are ordered so both directions of a
+# flow get the same key. Fragments are keyed on the addresses only, as they
+# carry no ports, and frames that aren't IP on their MAC addresses.
+def flow_key(raw):
+    if len(raw) < 14:
+        return bytes(raw)
+
+    ethertype = struct.unpack_from('!H', raw, 12)[0]
+    off = 14
+    while ethertype in ETH_VLAN and len(raw) >= off + 4:
+        ethertype = struct.unpack_from('!H', raw, off + 2)[0]
+        off += 4
+
+    if ethertype == ETH_IPV4 and len(raw) >= off + 20:
+        proto = raw[off + 9]
+        src = bytes(raw[off + 12:off + 16])
+        dst = bytes(raw[off + 16:off + 20])
+        l4 = off + (raw[off] & 0x0f) * 4
+        fragment = struct.unpack_from('!H', raw, off + 6)[0] & 0x3fff
+    elif ethertype == ETH_IPV6 and len(raw) >= off + 40:
+        proto = raw[off + 6]
+        src = bytes(raw[off + 8:off + 24])
+        dst = bytes(raw[off + 24:off + 40])
+        l4 = off + 40
+        fragment = proto == 44
+    else:
+        src = bytes(raw[6:12])
+        dst = bytes(raw[0:6])
+        return min(src, dst) + max(src, dst)
+
+    if proto in PORT_PROTOS and not fragment and len(raw) >= l4 + 4:
+        src += bytes(raw[l4:l4 + 2])
+        dst += bytes(raw[l4 + 2:l4 + 4])
+
+    return bytes([proto]) + min(src, dst) + max(src, dst)
+
+#---------------------------------[Classes]------------------------------------
+# Picks the packets kept by a sampled capture, about one in rate:
+# Count - Exactly every rate-th packet.
+# Random - Each packet with a probability of 1/rate.
+# Flow - Every packet of about one in rate flows, chosen by a hash of the
+#        flow key, so kept flows are complete.
+class Sampler:
+    def __init__(self, mode, rate):
+        self.mode = mode
+        self.rate = rate
+        self.prob = 1 / rate
+        self.seen = 0
+        self.kept = 0
+
+    # Decides whether a packet is kept. The raw frame is only needed by
+    # the Flow mode.
+    def keep(self, raw=None):
+        self.seen += 1
+
+        if self.mode == 'Count':
+            keep = self.seen % self.rate == 1 or self.rate == 1
+        elif self.mode == 'Random':
+            keep = random.random() < self.prob
+        elif self.mode == 'Flow':
+            keep = zlib.crc32(flow_key(raw)) % self.rate == 0
+        else:
+            keep = True
+
+        if keep:
+            self.kept += 1
+        return keep
+
+# Stops recording a flow once it is past a number of bytes or packets, the
+# rest of the flow is only counted. Flows are tracked in a table keyed on
+# the hash of their flow key holding [packets, bytes, last seen], in the
+# order they were last seen. When the table is full the flow idle the
+# longest is dropped; an idle flow that comes back is treated as a new one.
+class FlowCutoff:
+    def __init__(self, max_bytes=0, max_pkts=0, size=FLOW_TABLE_SIZE, timeout=FLOW_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.max_pkts = max_pkts
+        self.size = size
+        self.timeout = timeout
+        self.flows = {}
+
+        self.cut_pkts = 0
+        self.cut_bytes = 0
+
+    # Counts a packet against its flow and decides whether it is recorded.
+    # A cutoff of 0 doesn't limit that count.
+    def keep(self, raw, wirelen):
+        now = time.monotonic()
+        key = zlib.crc32(flow_key(raw))
+
+        # Taken out and put back at the end, so the table stays in the order
+        # the flows were last seen
+        flow = self.flows.pop(key, None)
+        if flow is None or now - flow[2] > self.timeout:
+            if flow is None and len(self.flows) >= self.size:
+                del self.flows[next(iter(self.flows))]
+            flow = [0, 0, now]
+        self.flows[key] = flow
+
+        flow[0] += 1
+        flow[1] += wirelen
+        flow[2] = now
+
+        if ((self.max_pkts > 0 and flow[0] > self.max_pkts) or
+                (self.max_bytes > 0 and flow[1] - wirelen >= self.max_bytes)):
+            self.cut_pkts += 1
+            self.cut_bytes += wirelen
+            return False
+        return True
+
+#------------------------------------------------------------------------------
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 #---------------------------------[Imports]------------------------------------
 # Internal modules
+from concurrent.futures import ThreadPoolExecutor
 import curses
 import grp
 import os
@@ -16,6 +17,7 @@ import traceback
 from termcolor import colored, cprint
 
 # File imports
+from capfile import capture_stem, DEFAULT_FLUSH
 import scapyreader
 
 #---------------------------------[Globals]------------------------------------
@@ -25,10 +27,32 @@ basesettings = {
     'Interface':        '',
     'SSID':             '',
     'BaseCapPath':      '',
+    'FlushPolicy':      DEFAULT_FLUSH,
     'BaseFileName':     '',
     'PathFile':         '',  
     'RunTime':          '',
-    'RunPeriod':        ''
+    'RunPeriod':        '',
+    'RotateSize':       '',
+    'RotateTime':       '',
+    'RotateKeep':       '',
+    'CapFilter':        '',
+    'DisplayMode':      'Lines',
+    'CaptureMode':      'Dissect',
+    'SnapLen':          '',
+    'MergeOutput':      'No',
+    'LiveStats':        'Yes',
+    'Outgoing':         'Yes',
+    'Compression':      '',
+    'Workers':          '',
+    'SampleMode':       'None',
+    'SampleRate':       '',
+    'CutoffSize':       '',
+    'CutoffPackets':    '',
+    'TriggerSecs':      '',
+    'TriggerSize':      '',
+    'TriggerPost':      '',
+    'TriggerRate':      '',
+    'TriggerFilter':    ''
 }
 
 global YorN
@@ -119,6 +143,11 @@ def exitscr():
     # Clears terminal screen
     clear() 
 
+# Used to load pickle files, such as the basesettings
+def load_obj(name):
+    with open('obj/' + name + '.pkl', 'rb') as f:
+        return pickle.load(f)
+
 # Saves dictionaries and the likes as pickle objects
 def save_obj(obj, name):
     with open('obj/'+ name + '.pkl', 'wb') as f:
@@ -271,6 +300,12 @@ def __SetupSteps(Step, Redo):
     elif Step == 4:
         __SetTimeRun(Redo)
     elif Step == 5:
+        __SetRotation(Redo)
+    elif Step == 6:
+        __SetCapFilter(Redo)
+    elif Step == 7:
+        __CaptureOptions(Redo)
+    elif Step == 8:
         __VerifyStart()
 
 # Has the user specify which interface they wish to monitor
@@ -296,10 +331,20 @@ def __InterfaceOptions(Redo):
 
     #Options = netifaces.interfaces()
 
+    Interfaces = list(Options)
+    Options.append("Multiple Interfaces")
+
     result = __PrintMenuOpts(Title, Notes, Options)
 
+    if result == "Multiple Interfaces":
+        # Has the user list the interfaces to capture at the same time
+        result = __MultiInterface(Interfaces)
+        if result == '':
+            __InterfaceOptions(Redo)
+            return
+
     # Parse the result
-    if result in Options:
+    if result in Options or result.split()[0] in Interfaces:
         # Sets the option if the returned result
         # is a specified option/ interface provided
         basesettings['Interface'] = str(result)
@@ -321,11 +366,41 @@ def __InterfaceOptions(Redo):
         errors(2)
         __InterfaceOptions(Redo)
 
+# Has the user enter several interfaces to capture on at once. Returns them
+# seperated by spaces, or an empty string to go back.
+def __MultiInterface(Interfaces):
+    Title = [
+        "Please enter the interfaces to capture on at the same time.\n",
+        "Each interface is captured by its own process into its own file.\n",
+        ("Interfaces available: " + " ".join(Interfaces) + "\n")
+    ]
+    Notes = [
+        "b to go back. x to quit.\n",
+        "ex: eth0 wlan0\n",
+        "\n"
+    ]
+    Prompt = [
+        "Interfaces: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    if result == 'b' or result == 'B':
+        return ''
+
+    selected = result.split()
+    for iface in selected:
+        if iface not in Interfaces:
+            errors(2)
+            return __MultiInterface(Interfaces)
+
+    return " ".join(selected)
+
 # Gathers the SSID name to ensure traffic is normative for that network
 def __GetSSID():
     # Gets the SSID of the set interface by parsing the 
     # iwconfig command.
-    ssid = os.popen("iwconfig "+ basesettings['Interface'] +" | sed -e \'/ESSID/!d\' -e \'s/.*ESSID:\"/\"/\'").read()
+    ssid = os.popen("iwconfig "+ basesettings['Interface'].split()[0] +" | sed -e \'/ESSID/!d\' -e \'s/.*ESSID:\"/\"/\'").read()
     ssid.rstrip()
     
     # Check if the SSID parsed is the valid SSID 
@@ -608,11 +683,712 @@ def __SetTimeRun(Redo):
         errors(2)
         __SetTimeRun(Redo)
 
-# Verifies the settings the user has chosen
+# Has the user specify if and when the base capture is split into segments
+def __SetRotation(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|          Step 5: Segment Rotation            |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify when to start a new capture segment...\n",
+        "n to not rotate. b to go back. x to quit.          \n",
+        "Formats:                                            \n",
+        "[num]MB - Maximum size of a segment in megabytes.   \n",
+        "[num]h - Maximum hours per segment.                 \n",
+        "[num]m - Maximum minutes per segment.               \n",
+        "[num]k - Number of segments to keep (0 keeps all).  \n",
+        "ex: 100MB 30m 48k or 1h or 500MB                    \n",
+        "\n"
+    ]
+    Prompt = [
+        "Rotation: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    size = ''
+    mins = 0
+    keep = ''
+
+    if result == 'b' or result == 'B':
+        # Go back to previous step
+        __SetupSteps(4, False)
+        return
+
+    elif result == 'n' or result == 'N':
+        # Keep the whole capture in a single file
+        basesettings['RotateSize'] = ''
+        basesettings['RotateTime'] = ''
+        basesettings['RotateKeep'] = ''
+
+    else:
+        # Parse one or more rotation thresholds
+        rotation = result.split(" ")
+        for val in rotation:
+            if val.upper().endswith("MB") and isinteger(val[:-2]):
+                size = str(int(val[:-2]))
+            elif val.endswith("h") and isinteger(val[:-1]):
+                mins += int(val[:-1]) * 60
+            elif val.endswith("m") and isinteger(val[:-1]):
+                mins += int(val[:-1])
+            elif val.endswith("k") and isinteger(val[:-1]):
+                keep = str(int(val[:-1]))
+            elif val != '':
+                # If invalid input, print error and restart step
+                errors(2)
+                __SetRotation(Redo)
+                return
+
+        if size == '' and mins == 0:
+            errors(2)
+            __SetRotation(Redo)
+            return
+
+        basesettings['RotateSize'] = size
+        basesettings['RotateTime'] = str(mins) if mins > 0 else ''
+        basesettings['RotateKeep'] = keep
+
+    # Return back to __VerifyStart() or move to the next step
+    if Redo == True:
+        clear()
+        __VerifyStart()
+    else:
+        __SetupSteps(6, False)
+
+# Has the user specify a BPF filter so only wanted traffic is captured
+def __SetCapFilter(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|           Step 6: Capture Filter             |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify a capture filter (tcpdump syntax)...\n",
+        "Filtered out traffic is dropped in the kernel.     \n",
+        "n to capture all traffic. b to go back. x to quit. \n",
+        "ex: tcp port 443 or udp port 53                    \n",
+        "ex: not arp and host 192.168.1.10                  \n",
+        "\n"
+    ]
+    Prompt = [
+        "Filter: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    if result == 'b' or result == 'B':
+        # Go back to previous step
+        __SetupSteps(5, False)
+        return
+
+    elif result == 'n' or result == 'N':
+        # Capture everything on the interface
+        basesettings['CapFilter'] = ''
+
+    else:
+        # Compiles the filter against the selected interface and shows the
+        # resulting BPF program so the user can confirm it.
+        # Several interfaces share the filter, it is checked on the first
+        valid, program = scapyreader.check_filter(basesettings['Interface'].split()[0], result)
+
+        if valid == False:
+            print(colored("[*] Error: Invalid capture filter.", 'red'))
+            for line in program:
+                print(line)
+            input("Any key to continue... ")
+            __SetCapFilter(Redo)
+            return
+
+        Title = [
+            "Is this capture filter correct?\n",
+            ("Filter: " + result + "\n"),
+            ("Compiled to " + str(len(program)) + " BPF instructions:\n")
+        ]
+        # Only the start of long programs fits on the screen
+        for line in program[:12]:
+            Title.append("    " + line + "\n")
+        if len(program) > 12:
+            Title.append("    ...\n")
+        Title.append("\n")
+        Notes = [
+            "Use (up or w) and (down or s) keys to select. x to quit.\n"
+        ]
+
+        confirm = __PrintMenuOpts(Title, Notes, YorN)
+
+        if confirm == "Yes":
+            basesettings['CapFilter'] = result
+        else:
+            __SetCapFilter(Redo)
+            return
+
+    # Return back to __VerifyStart() or move to the next step
+    if Redo == True:
+        clear()
+        __VerifyStart()
+    else:
+        __SetupSteps(7, False)
+
+# Lets the user change the optional capture settings. Each option returns
+# back to this menu until the user continues.
+def __CaptureOptions(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|           Step 7: Capture Options            |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Select an option to change it.  \n",
+        "Use w(up) and s(down) keys to select. x to quit.\n",
+        "--------------------------------\n"
+    ]
+    Options = [
+        "Continue",
+        "Go Back",
+        "Display Mode: " + basesettings['DisplayMode'],
+        "Capture Mode: " + basesettings['CaptureMode'],
+        "Snap Length: " + (basesettings['SnapLen'] or "Full packets"),
+        "Merge Captures: " + basesettings['MergeOutput'],
+        "Live Stats: " + basesettings['LiveStats'],
+        "Compression: " + (basesettings['Compression'] or "None"),
+        "Capture Workers: " + (basesettings['Workers'] or "1"),
+        "Sampling: " + __SamplingText(),
+        "Flow Cutoff: " + __CutoffText(),
+        "Triggered Capture: " + __TriggerText(),
+        "Outgoing Packets: " + basesettings['Outgoing'],
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, Options)
+    resval = Options.index(result)
+
+    # Parse the result
+    if resval == 0:
+        # Return back to __VerifyStart() or move to the next step
+        if Redo == True:
+            clear()
+            __VerifyStart()
+        else:
+            __SetupSteps(8, False)
+
+    elif resval == 1:
+        # Go back to previous step
+        __SetupSteps(6, False)
+
+    elif resval == 2:
+        __SetDisplayMode(Redo)
+
+    elif resval == 3:
+        __SetCaptureMode(Redo)
+
+    elif resval == 4:
+        __SetSnapLen(Redo)
+
+    elif resval == 5:
+        __SetMergeOutput(Redo)
+
+    elif resval == 6:
+        __SetLiveStats(Redo)
+
+    elif resval == 7:
+        __SetCompression(Redo)
+
+    elif resval == 8:
+        __SetWorkers(Redo)
+
+    elif resval == 9:
+        __SetSampling(Redo)
+
+    elif resval == 10:
+        __SetCutoff(Redo)
+
+    elif resval == 11:
+        __SetTrigger(Redo)
+
+    elif resval == 12:
+        __SetOutgoing(Redo)
+
+# Has the user specify how the captured packets are shown during the scan
+def __SetDisplayMode(Redo):
+    Title = [
+        "How should packets be displayed during the scan?\n",
+        "Lines - One line per packet (rate limited).\n",
+        "Dashboard - Live packet rates, top talkers and protocols.\n",
+        "None - Only the summary once the scan stops.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+    Options = [
+        "Lines",
+        "Dashboard",
+        "None",
+        "Go Back"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, Options)
+
+    if result != "Go Back":
+        basesettings['DisplayMode'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify if captured packets are dissected by the sniffer
+def __SetCaptureMode(Redo):
+    Title = [
+        "How should packets be captured?\n",
+        "Dissect - Every packet is dissected by scapy as it arrives.\n",
+        "Raw - Packets are kept as bytes and only dissected when displayed\n",
+        "      or added to the stats. Keeps up with busier links.\n",
+        "Ring - Like Raw, but the kernel fills a memory-mapped ring that is\n",
+        "       written to the capture a block at a time. Linux only.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+    Options = [
+        "Dissect",
+        "Raw",
+        "Ring",
+        "Go Back"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, Options)
+
+    if result != "Go Back":
+        basesettings['CaptureMode'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify how many bytes of each packet are saved
+def __SetSnapLen(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|                 Snap Length                  |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify how many bytes of each packet to save...\n",
+        "Headers are usually within the first 128 bytes.       \n",
+        "n to save full packets. b to go back. x to quit.      \n",
+        "ex: 128                                               \n",
+        "\n"
+    ]
+    Prompt = [
+        "Snap Length: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    if result == 'n' or result == 'N':
+        basesettings['SnapLen'] = ''
+
+    elif result != 'b' and result != 'B':
+        if isinteger(result) and int(result) > 0:
+            basesettings['SnapLen'] = str(int(result))
+        else:
+            # If invalid input, print error and restart step
+            errors(2)
+            __SetSnapLen(Redo)
+            return
+
+    __CaptureOptions(Redo)
+
+# Has the user specify if the captures of several interfaces are merged
+# into one file when the scan ends
+def __SetMergeOutput(Redo):
+    Title = [
+        "Merge the captures of multiple interfaces or workers into one file?\n",
+        "Packets are merged in timestamp order into <name>_merged.pcap.\n",
+        "The per-interface captures are kept.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, YorN)
+
+    if result != "Go Back":
+        basesettings['MergeOutput'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify if the packets the host sends are captured
+def __SetOutgoing(Redo):
+    Title = [
+        "Capture the packets this host sends?\n",
+        "With No only the packets the interface receives are kept,\n",
+        "on loopback each packet is then captured once instead of twice.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, YorN)
+
+    if result != "Go Back":
+        basesettings['Outgoing'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify if the stats are collected during the capture
+def __SetLiveStats(Redo):
+    Title = [
+        "Collect the stats while capturing?\n",
+        "The stats report is then ready as soon as the scan stops,\n",
+        "instead of reading the whole capture back afterwards.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, YorN)
+
+    if result != "Go Back":
+        basesettings['LiveStats'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify if the capture files are compressed as they are written
+def __SetCompression(Redo):
+    Title = [
+        "Compress the capture files as they are written?\n",
+        "gzip - Smaller files, readable by most tools (.pcap.gz).\n",
+        "zstd - Faster and smaller, needs zstandard (.pcap.zst).\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+    Options = [
+        "None",
+        "gzip",
+        "zstd",
+        "Go Back"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, Options)
+
+    if result == "None":
+        basesettings['Compression'] = ''
+    elif result != "Go Back":
+        basesettings['Compression'] = result
+
+    __CaptureOptions(Redo)
+
+# Describes the sampling settings for the capture options
+def __SamplingText():
+    if basesettings['SampleMode'] == 'None' or basesettings['SampleRate'] == '':
+        return "None"
+    return basesettings['SampleMode'] + " 1 in " + basesettings['SampleRate']
+
+# Has the user specify if only a sample of the packets is captured, and
+# how many of them
+def __SetSampling(Redo):
+    Title = [
+        "Capture only a sample of the packets?\n",
+        "Count - Keeps exactly one in every N packets.\n",
+        "Random - Keeps each packet with a chance of 1 in N.\n",
+        "Flow - Keeps every packet of about one in N flows.\n",
+        "The stats are scaled back up by N.\n",
+        "\n"
+    ]
+    Notes = [
+        "Use (up or w) and (down or s) keys to select. x to quit.\n"
+    ]
+    Options = [
+        "None",
+        "Count",
+        "Random",
+        "Flow",
+        "Go Back"
+    ]
+
+    result = __PrintMenuOpts(Title, Notes, Options)
+
+    if result == "None":
+        basesettings['SampleMode'] = 'None'
+        basesettings['SampleRate'] = ''
+
+    elif result != "Go Back":
+        Title = [
+            "+----------------------------------------------+\n",
+            "|                 Sample Rate                  |\n",
+            "+----------------------------------------------+\n",
+            "\n"
+        ]
+        Notes = [
+            "Please specify N, to keep one in N " + ("flows" if result == "Flow" else "packets") + "...\n",
+            "ex: 10                                         \n",
+            "\n"
+        ]
+        Prompt = [
+            "Sample Rate: "
+        ]
+
+        rate = __PrintMenuInput(Title, Notes, Prompt)
+
+        if isinteger(rate) and int(rate) > 1:
+            basesettings['SampleMode'] = result
+            basesettings['SampleRate'] = str(int(rate))
+        else:
+            # If invalid input, print error and restart step
+            errors(2)
+            __SetSampling(Redo)
+            return
+
+    __CaptureOptions(Redo)
+
+# Describes the flow cutoff settings for the capture options
+def __CutoffText():
+    limits = []
+    if basesettings['CutoffSize'] != '':
+        limits.append(basesettings['CutoffSize'] + "KB")
+    if basesettings['CutoffPackets'] != '':
+        limits.append(basesettings['CutoffPackets'] + " packets")
+    return " or ".join(limits) if limits else "None"
+
+# Has the user specify how much of each flow is recorded. Packets of a flow
+# past the cutoff are counted but not written to the capture.
+def __SetCutoff(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|                 Flow Cutoff                  |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify how much of each flow to record...  \n",
+        "The rest of a flow is counted but not saved.       \n",
+        "n to record whole flows. b to go back. x to quit.  \n",
+        "Formats:                                           \n",
+        "[num]KB - Kilobytes recorded per flow.             \n",
+        "[num]p - Packets recorded per flow.                \n",
+        "ex: 16KB 50p or 64KB                               \n",
+        "\n"
+    ]
+    Prompt = [
+        "Cutoff: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    size = ''
+    pkts = ''
+
+    if result == 'n' or result == 'N':
+        basesettings['CutoffSize'] = ''
+        basesettings['CutoffPackets'] = ''
+
+    elif result != 'b' and result != 'B':
+        for val in result.split(" "):
+            if val.upper().endswith("KB") and isinteger(val[:-2]) and int(val[:-2]) > 0:
+                size = str(int(val[:-2]))
+            elif val.endswith("p") and isinteger(val[:-1]) and int(val[:-1]) > 0:
+                pkts = str(int(val[:-1]))
+            elif val != '':
+                # If invalid input, print error and restart step
+                errors(2)
+                __SetCutoff(Redo)
+                return
+
+        if size == '' and pkts == '':
+            errors(2)
+            __SetCutoff(Redo)
+            return
+
+        basesettings['CutoffSize'] = size
+        basesettings['CutoffPackets'] = pkts
+
+    __CaptureOptions(Redo)
+
+# Describes the triggered capture settings for the capture options
+def __TriggerText():
+    limits = []
+    if basesettings['TriggerSecs'] != '':
+        limits.append(basesettings['TriggerSecs'] + "s")
+    if basesettings['TriggerSize'] != '':
+        limits.append(basesettings['TriggerSize'] + "MB")
+    if not limits:
+        return "Off"
+
+    triggers = ["signal"]
+    if basesettings['TriggerRate'] != '':
+        triggers.append(basesettings['TriggerRate'] + "pps")
+    if basesettings['TriggerFilter'] != '':
+        triggers.append("filter")
+    return "last " + " or ".join(limits) + " on " + ", ".join(triggers)
+
+# Has the user specify a triggered capture. The last packets are kept in
+# memory and only written to disk around a trigger: a SIGUSR1, a packet
+# rate or a packet matching a trigger filter.
+def __SetTrigger(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|              Triggered Capture               |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify how much traffic to keep in memory...   \n",
+        "It is only saved when triggered, by kill -USR1 or below.\n",
+        "n to write all traffic. b to go back. x to quit.       \n",
+        "Formats:                                               \n",
+        "[num]s - Seconds of traffic kept in memory.            \n",
+        "[num]MB - Most megabytes of traffic kept in memory.    \n",
+        "[num]a - Seconds saved after a trigger (default 60).   \n",
+        "[num]pps - Trigger when the packet rate reaches this.  \n",
+        "ex: 30s 64MB 120a 5000pps or 60s                       \n",
+        "\n"
+    ]
+    Prompt = [
+        "Trigger: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    secs = ''
+    size = ''
+    post = ''
+    rate = ''
+
+    if result == 'b' or result == 'B':
+        __CaptureOptions(Redo)
+        return
+
+    elif result == 'n' or result == 'N':
+        basesettings['TriggerSecs'] = ''
+        basesettings['TriggerSize'] = ''
+        basesettings['TriggerPost'] = ''
+        basesettings['TriggerRate'] = ''
+        basesettings['TriggerFilter'] = ''
+        __CaptureOptions(Redo)
+        return
+
+    for val in result.split(" "):
+        if val.endswith("pps") and isinteger(val[:-3]) and int(val[:-3]) > 0:
+            rate = str(int(val[:-3]))
+        elif val.upper().endswith("MB") and isinteger(val[:-2]) and int(val[:-2]) > 0:
+            size = str(int(val[:-2]))
+        elif val.endswith("s") and isinteger(val[:-1]) and int(val[:-1]) > 0:
+            secs = str(int(val[:-1]))
+        elif val.endswith("a") and isinteger(val[:-1]) and int(val[:-1]) >= 0:
+            post = str(int(val[:-1]))
+        elif val != '':
+            # If invalid input, print error and restart step
+            errors(2)
+            __SetTrigger(Redo)
+            return
+
+    if secs == '' and size == '':
+        errors(2)
+        __SetTrigger(Redo)
+        return
+
+    basesettings['TriggerSecs'] = secs
+    basesettings['TriggerSize'] = size
+    basesettings['TriggerPost'] = post
+    basesettings['TriggerRate'] = rate
+
+    __SetTriggerFilter(Redo)
+
+# Has the user specify a filter that fires the trigger on a matching packet
+def __SetTriggerFilter(Redo):
+    Title = [
+        "+----------------------------------------------+\n",
+        "|                Trigger Filter                |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify a trigger filter (tcpdump syntax)...\n",
+        "Any packet matching it fires the trigger.         \n",
+        "n for no trigger filter. x to quit.               \n",
+        "ex: tcp[tcpflags] & tcp-rst != 0                  \n",
+        "\n"
+    ]
+    Prompt = [
+        "Trigger Filter: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    if result == 'n' or result == 'N':
+        basesettings['TriggerFilter'] = ''
+
+    else:
+        valid, program = scapyreader.check_filter(basesettings['Interface'].split()[0], result)
+
+        if valid == False:
+            print(colored("[*] Error: Invalid trigger filter.", 'red'))
+            for line in program:
+                print(line)
+            input("Any key to continue... ")
+            __SetTriggerFilter(Redo)
+            return
+
+        basesettings['TriggerFilter'] = result
+
+    __CaptureOptions(Redo)
+
+# Has the user specify how many processes capture a single interface
+def __SetWorkers(Redo):
+    cores = os.cpu_count() or 1
+
+    Title = [
+        "+----------------------------------------------+\n",
+        "|               Capture Workers                |\n",
+        "+----------------------------------------------+\n",
+        "\n"
+    ]
+    Notes = [
+        "Please specify how many processes capture the interface...\n",
+        "The kernel shares the flows out between them and each one  \n",
+        "writes its own capture file. This machine has " + str(cores) + " cores.\n",
+        "c for one per core. b to go back. x to quit.              \n",
+        "ex: 4                                                     \n",
+        "\n"
+    ]
+    Prompt = [
+        "Workers: "
+    ]
+
+    result = __PrintMenuInput(Title, Notes, Prompt)
+
+    # Parse the result
+    if result == 'c' or result == 'C':
+        basesettings['Workers'] = str(cores) if cores > 1 else ''
+
+    elif result != 'b' and result != 'B':
+        if isinteger(result) and int(result) > 0:
+            basesettings['Workers'] = str(int(result)) if int(result) > 1 else ''
+        else:
+            # If invalid input, print error and restart step
+            errors(2)
+            __SetWorkers(Redo)
+            return
+
+    __CaptureOptions(Redo)
+
+
 def __VerifyStart():
     Title = [
         "+----------------------------------------------+\n",
-        "|            Step 5: Verify Setting            |\n",
+        "|            Step 8: Verify Setting            |\n",
         "+----------------------------------------------+\n",
         "\n"
     ]
@@ -632,7 +1408,7 @@ def __VerifyStart():
     # Parse the result
     if result == "Go Back":
         # Returns back to the previous step
-        __SetupSteps(4, False)
+        __SetupSteps(7, False)
 
     elif result == "Yes":
         # Accepts the settings and saves them to a pkl object,
@@ -654,6 +1430,9 @@ def __VerifyStart():
             "Base Capture Save Path",
             "Base Capture Save Filename",
             "Set Run Time or Run Period",
+            "Segment Rotation",
+            "Capture Filter",
+            "Capture Options",
         ]
 
         result = __PrintMenuOpts(Title, Notes, Options)
@@ -693,15 +1472,30 @@ def __RunStats():
         "No"
     ]
 
+    # The stats were already collected during the capture
+    if basesettings.get('StatsReports'):
+        for report in basesettings['StatsReports']:
+            print("Stats outputted to " + report)
+        return
+
     result = __PrintMenuOpts(Title, Notes, options)
 
     if result == "No":
         exit(1)
     elif result == "Yes":
-        command = "python3 pcapstats.py " + basesettings['PathFile'] + " > " + basesettings['BaseCapPath'] + '/' + basesettings['BaseFileName'] + ".txt"
-        os.system(command)
-        print("Stats outputted to " + "stats/" + basesettings['BaseFileName'] + ".txt")
+        # Analyzes the capture files (or segments) in parallel, one per
+        # core at most, writing the stats of each next to it.
+        segments = basesettings.get('Segments', [basesettings['PathFile']])
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            list(pool.map(__SegmentStats, segments))
+
+        for pcap in segments:
+            print("Stats outputted to " + capture_stem(pcap) + ".txt")
 
+# Runs pcapstats on one capture file, saving its output next to it
+def __SegmentStats(pcap):
+    with open(capture_stem(pcap) + ".txt", 'w') as out:
+        subprocess.run(["python3", "pcapstats.py", pcap], stdout=out)
 
 def __DuplicateFile():
     global basesettings
@@ -725,6 +1519,8 @@ def __RunBase():
     clear()
     print(colored("Running Scan. Please do not close this terminal!\n", 'green'))
     bc = scapyreader.BaseCap()
+    # Picks up the capture files written by the base capture
+    basesettings = load_obj('settings')
     #drop_privileges()
     __RunStats()
 
@@ -750,5 +1546,8 @@ def __Main():
     #exitscr()
 
 #-----------------------------------[Run]--------------------------------------
-__Main()
+# Only runs the setup when started as a script, so the curses helpers can
+# be imported by the base capture.
+if __name__ == '__main__':
+    __Main()
 #------------------------------------------------------------------------------
\ No newline at end of file
@@ -1,30 +1,66 @@
 #!/usr/bin/python3
 #---------------------------------[Imports]------------------------------------
 # Internal modules
-from collections import Counter
+import bisect
+from collections import Counter, defaultdict
 import os
 import pickle
 import socket
 import sys
+import time
 
 
 # Downloaded modules
-import matplotlib.pyplot as plt
-from openpyxl import Workbook
-from openpyxl import load_workbook
-import pandas as pd
-from prettytable import PrettyTable
-from scapy.all import *
-from scapy.all import Ether, DNS, DNSRR
-from scapy.layers.http import HTTPRequest
-import seaborn as sns
-from tabulate import tabulate
+# scapy and the plotting/table modules are loaded on first use, see
+# load_scapy() and load_reporting()
 from termcolor import colored, cprint
 
+# File imports
+from capfile import capture_stem, read_meta, split_ts, CapReader
+import pktheaders
+
 #---------------------------------[Globals]------------------------------------
 global savepath
 
+# Sampled captures kept about one in scale packets, every count is
+# multiplied by it. Read from the metadata saved with the capture.
+scale = 1
+
+# Layers scapy dissects the payload of TCP and UDP with, by ports. Cleared
+# once it holds PAYLOAD_CACHE ports.
+PAYLOAD_CACHE = 65536
+payload_cache = {}
+
 #--------------------------------[Functions]-----------------------------------
+# Loads the scapy layers the reports look at. Importing scapy.all takes
+# about a second, most of it in modules the stats never use (the sniffing,
+# routing and answering machinery). Every protocol layer scapy loads by
+# default is still loaded, as the layer reports name whatever layers the
+# packets dissect into.
+def load_scapy():
+    global conf, Raw, Ether, ARP, IP, TCP, UDP, IPv6, DNS, DNSRR, HTTPRequest
+
+    import scapy.layers.all
+    from scapy.config import conf
+    from scapy.packet import Raw
+    from scapy.layers.l2 import Ether, ARP
+    from scapy.layers.inet import IP, TCP, UDP
+    from scapy.layers.inet6 import IPv6
+    from scapy.layers.dns import DNS, DNSRR
+    from scapy.layers.http import HTTPRequest
+
+# Loads the modules that count and print the tables and draw the graphs,
+# they take over a second to import and a live capture only needs them at
+# the end
+def load_reporting():
+    global np, pd, sns, tabulate, PrettyTable
+
+    import numpy as np
+    import pandas as pd
+    import seaborn as sns
+    from tabulate import tabulate
+    from prettytable import PrettyTable
+
 # Determines if directory path exists.
 def ispath(path):
     if path.startswith('~'):
@@ -62,155 +98,478 @@ def __GetPktLayers(pkt):
 
     return pkt_layer
 
-# Reads the PCAP file and parses the data into a list of
-# scapy.packet structures.
-def __ReadPCAP(PCAP):
-    packets = rdpcap(PCAP)
-    return packets
-
-# Collects the statistics for the provided packets.
-def __GetStats(packets):
-    __Duration(packets)
-
-    __IPsrc_Top(packets)
-    __IPsrc_Time(packets)
-    
-    __IPdest_Top(packets)
-    __IPdest_Time(packets)
-    
-    __L3_Count(packets)
-    __L3_Time(packets)
-
-    __L4_Count(packets)
-    __L4_Time(packets)
-    
-    __L5_Count(packets)
-    __L5_Time(packets)
-
-    
-    __HTTP_Count(packets)
-    __HTTP_Time(packets)
-    
-    __DNS_Count(packets)
-    __DNS_Time(packets)
-    
-    __ARP_Count(packets)
-    __ARP_Time(packets)
-    
-# Prints out the start and end of the capture based
-# on packet timestamps
-def __Duration(packets):
-    times = []
-
-    for pkt in packets:
-        times.append(float(pkt.time))
-    times.sort()
-
-    start = convert_ts(times[0])
-    print("Capture Start:\n" + start)
-
-    end = convert_ts(times[-1])
-    print("Capture End:\n" + end)
-
-
-#----------------[Total Counts]----------------
-# Count Graphs/Tables produced:
-# -Total packets from IP source
-# -Total packets from IP Destination
-# -Total packets with Layer 3 Types
-# -Total packets with Layer 4 Types
-# -Total packets with Layer 5 Types
-# -Total HTTP/HTTPS Requests made from source
-# -Total DNS Queries made from source
-# -Total ARP reqiests made from source
-
-# Produces a Count bar graph from provided data.
-def __GraphingCount(df, xName, Title, rotate): 
-    global savepath
-    sns.set_palette(sns.color_palette("magma"))
-
-    plt = sns.countplot(data = df, x = xName)
-    
-    plt.set_xticklabels(plt.get_xticklabels(), fontsize=7, rotation=rotate)
-    for p in plt.patches:
-        plt.annotate(format(p.get_height(), '.0f'), (p.get_x() + p.get_width() / 2.,
-        p.get_height()), ha = 'center', va = 'center', xytext = (0, 5),
-        textcoords = 'offset points', fontsize=7)
-
-    plt.figure.savefig((savepath + "/" + Title), bbox_inches = "tight")
-    plt.figure.clf()
-
-
-# Analyzes the provided packets, calculates the ammount
-# of packets from an IP source overall and 
-# generates a table and a graph displaying the data.
-def __IPsrc_Top(packets):
-    title = 'Top Source IPs from Capture'
-    index = 'IP Source'
-    filename = 'IPSource_Count.png'
-
-    srcIP = []
-
-    for pkt in packets:
-        if IP in pkt:
-            srcIP.append(pkt[IP].src)
-        elif IPv6 in pkt:
-            srcIP.append(pkt[IPv6].src)
-
-    cnt = Counter()
-
-    for ip in srcIP:
-        cnt[ip] += 1
-    
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    for ip, count in cnt.most_common():
-        table.add_row([ip, count])
-
-    print(table)
-
-    df = pd.DataFrame(srcIP, columns = [index])
-    __GraphingCount(df, index, filename, 90)
-
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of packets from an IP destination overall and 
-# generates a table and a graph displaying the data.
-def __IPdest_Top(packets):
-    title = 'Top Destination IPs from Capture'
-    index = 'IP Destination'
-    filename = 'IPDest_Count.png'
-
-    dstIP = []
-
-    for pkt in packets:
-        if IP in pkt:
-            dstIP.append(pkt[IP].dst)
-        elif IPv6 in pkt:
-            dstIP.append(pkt[IPv6].dst)
-
-    cnt = Counter()
-
-    for ip in dstIP:
-        cnt[ip] += 1
-    
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    for ip, count in cnt.most_common():
-        table.add_row([ip, count])
-
-    print(table)
-
-    
-
-    df = pd.DataFrame(dstIP, columns = [index])
-    __GraphingCount(df, index, filename, 90)
-    print("(" + filename + ")\n")
+# Yields the time, length on the wire and data of each packet between start
+# and end (either can be None for an open range), straight from the capture
+# on disk, then closes the reader. gzip and zstd compressed captures are
+# decompressed while reading. The time index written alongside the capture
+# is used to skip straight to start, and reading ends at the first packet
+# past end.
+def __Records(reader, start, end):
+    if start is not None:
+        reader.seek_time(start)
+
+    try:
+        for sec, usec, wirelen, data in reader:
+            # Rounded the same way as the times scapy reads from a pcap
+            timestamp = (sec * 1000000 + usec) / 1000000
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                break
+            yield timestamp, wirelen, data
+    finally:
+        reader.close()
+
+# Finds the number of packets between start and end, and the times of the
+# first and last of them, without dissecting anything.
+def __TimeSpan(PCAP, start, end):
+    packets = 0
+    first = None
+    last = None
+    for timestamp, wirelen, data in __Records(CapReader(PCAP), start, end):
+        packets += 1
+        if first is None or timestamp < first:
+            first = timestamp
+        if last is None or timestamp > last:
+            last = timestamp
+
+    return packets, first, last
+
+# Yields the time, wire length, report keys and ports of each packet between
+# start and end, one packet at a time, so only one packet of the capture is
+# held in memory.
+def __StreamPCAP(PCAP, start, end):
+    load_scapy()
+    reader = CapReader(PCAP)
+    cls = conf.l2types.get(reader.linktype, Raw)
+
+    for timestamp, wirelen, data in __Records(reader, start, end):
+        counts, times, ports = frame_keys(data, cls)
+        yield timestamp, wirelen, counts, times, ports
+
+# Converts a time range argument into a timestamp. Takes either a
+# timestamp or a "YYYY-mm-dd HH:MM[:SS]" local time, "-" leaves it open.
+def parse_time(value):
+    if value in ('', '-'):
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            pass
+
+    print("[*] Error: Unknown time " + value)
+    sys.exit()
+
+#----------------[Reports]----------------
+# Graphs/tables produced, each as a total count and over time:
+# -Packets from IP source
+# -Packets to IP Destination
+# -Packets with Layer 3 Types
+# -Packets with Layer 4 Types
+# -Packets with Layer 5 Types
+# -HTTP/HTTPS Requests made from source
+# -DNS name resolutions
+# -ARP requests made from source
+#
+# The capture is walked once. Every packet is dissected into the keys of all
+# reports by packet_keys() and fed to the accumulator of each report, so
+# adding a report doesn't add another pass over the packets.
+
+# Count reports: name, title, index, graph filename, label rotation
+COUNT_REPORTS = [
+    ('IPsrc',   'Top Source IPs from Capture',      'IP Source',        'IPSource_Count.png',   90),
+    ('IPdest',  'Top Destination IPs from Capture', 'IP Destination',   'IPDest_Count.png',     90),
+    ('L3',      'Layer 3 Packet Count',             'L3 Types',         'L3Type_Count.png',     0),
+    ('L4',      'Layer 4 Packet Count',             'L4 Types',         'L4Type_Count.png',     90),
+    ('L5',      'Layer 5 Packet Count',             'L5 Types',         'L5Type_Count.png',     90),
+    ('HTTP',    'Top HTTP/HTTPS Requests',          'Request',          '',                     90),
+    ('DNS',     'Top DNS name resolutions',         'Name',             'DNSNameRes_Count.png', 90),
+    ('ARP',     'Total ARP requests by source',     'ARP Source',       'ARPSource_Count.png',  0)
+]
+
+# Time reports: name, title, index, graph filename
+TIME_REPORTS = [
+    ('IPsrc',   'IP Sources over Time',             'IP Source',        'IPSource_OverTime.png'),
+    ('IPdest',  'IP Destinations over Time',        'IP Destination',   'IPDest_OverTime.png'),
+    ('L3',      'Layer 3 Packets over Time',        'L3 Types',         'L3Type_OverTime.png'),
+    ('L4',      'Layer 4 Packets over Time',        'L4 Types',         'L4Type_OverTime.png'),
+    ('L5',      'Layer 5 Packets over Time',        'L5 Types',         'L5Type_OverTime.png'),
+    ('HTTP',    'HTTP/HTTPS Packets over Time',     'HTTP-HTTPS',       'HTTP-HTTPS_OverTime.png'),
+    ('DNS',     'DNS Packets over Time',            'Names',            'DNS_OverTime.png'),
+    ('ARP',     'ARP Packets over Time',            'Source',           'ARP_OverTime.png')
+]
+
+# Key columns of the packet table: column, report, and whether it holds the
+# key of the report's time report or of its count report. The address and
+# layer reports count the same key in total and over time, the others have
+# their own count keys. DNS answers, of which a packet can have several,
+# are kept apart in dns_names.
+TABLE_COLUMNS = [
+    ('src',         'IPsrc',    'time'),
+    ('dst',         'IPdest',   'time'),
+    ('l3',          'L3',       'time'),
+    ('l4',          'L4',       'time'),
+    ('l5',          'L5',       'time'),
+    ('http',        'HTTP',     'time'),
+    ('http_req',    'HTTP',     'count'),
+    ('dns',         'DNS',      'time'),
+    ('arp',         'ARP',      'time'),
+    ('arp_req',     'ARP',      'count')
+]
+KEY_COLUMNS = [column for column, report, source in TABLE_COLUMNS] + ['dns_names']
+
+# Column of the packet table each report is counted from
+COUNT_COLUMNS = {'IPsrc': 'src', 'IPdest': 'dst', 'L3': 'l3', 'L4': 'l4', 'L5': 'l5',
+                 'HTTP': 'http_req', 'DNS': 'dns_names', 'ARP': 'arp_req'}
+TIME_COLUMNS = {'IPsrc': 'src', 'IPdest': 'dst', 'L3': 'l3', 'L4': 'l4', 'L5': 'l5',
+                'HTTP': 'http', 'DNS': 'dns', 'ARP': 'arp'}
+
+# Packets put in the packet table before the reports count them
+TABLE_CHUNK = 65536
+
+# Builds the keys of every report from what was found in one packet: the
+# source and destination of its IP or IPv6 layer (None without one) and
+# whether that is IPv6, its layer names, whether it is TCP to or from port
+# 443, the URL of an HTTP request, the DNS answers (None without DNS) and
+# the source of an ARP packet. Returns the keys of the count reports (a
+# list per report) and the key of the time reports (one per report).
+def report_keys(src, dst, v6, layers, https, url, names, arp):
+    counts = {}
+    times = {}
+
+    if src is not None:
+        counts['IPsrc'] = [src]
+        counts['IPdest'] = [dst]
+        times['IPsrc'] = src
+        times['IPdest'] = dst
+
+    for name, depth in (('L3', 2), ('L4', 3), ('L5', 4)):
+        if len(layers) >= depth:
+            counts[name] = [layers[depth - 1]]
+            times[name] = layers[depth - 1]
+
+    if https:
+        if src is not None:
+            counts['HTTP'] = [src + " -> https:" + dst]
+            times['HTTP'] = ("https:" if v6 else "https:\n") + dst
+    elif url is not None:
+        times['HTTP'] = url
+        if src is not None:
+            counts['HTTP'] = [src + " -> " + url]
+
+    if names:
+        counts['DNS'] = names
+        times['DNS'] = names[-1]
+
+    if arp is not None:
+        counts['ARP'] = [arp[0] + '(' + arp[1] + ')']
+        times['ARP'] = arp[0] + '\n' + arp[1]
+
+    return counts, times
+
+# Gets the host and path of an HTTP request in a packet, None if it has no
+# request (or it can't be decoded)
+def __HTTPUrl(pkt):
+    if not pkt.haslayer(HTTPRequest):
+        return None
+    try:
+        return pkt[HTTPRequest].Host.decode() + pkt[HTTPRequest].Path.decode()
+    except:
+        return None
+
+# Gets the names a DNS packet resolves, None if the packet has no DNS.
+# Malformed packets (often other traffic on a DNS port) can claim more
+# answers than they hold, only those found are returned.
+def __DNSNames(pkt):
+    if DNS not in pkt:
+        return None
+
+    names = []
+    for x in range(pkt[DNS].ancount):
+        try:
+            names.append(pkt[DNSRR][x].rdata)
+        except IndexError:
+            break
+    return names
+
+# Extracts what each report counts for one dissected packet. Returns the
+# keys of the count and time reports (see report_keys()) and the ports and
+# TCP flags of its TCP or UDP layer (None without one).
+def packet_keys(pkt):
+    if IP in pkt:
+        src, dst, v6 = pkt[IP].src, pkt[IP].dst, False
+    elif IPv6 in pkt:
+        src, dst, v6 = pkt[IPv6].src, pkt[IPv6].dst, True
+    else:
+        src, dst, v6 = None, None, False
+
+    https = TCP in pkt and (str(pkt[TCP].dport) == "443" or str(pkt[TCP].sport) == "443")
+
+    arp = None
+    if ARP in pkt:
+        arp = (pkt[ARP].psrc, pkt[Ether].src)
+
+    ports = None
+    if TCP in pkt:
+        ports = (pkt[TCP].sport, pkt[TCP].dport, int(pkt[TCP].flags))
+    elif UDP in pkt:
+        ports = (pkt[UDP].sport, pkt[UDP].dport, 0)
+
+    counts, times = report_keys(src, dst, v6, __GetPktLayers(pkt), https, __HTTPUrl(pkt),
+                                __DNSNames(pkt), arp)
+    return counts, times, ports
+
+# Extracts what each report counts for one frame of the given link layer
+# class, without having scapy dissect it where possible. pktheaders parses
+# the headers of Ethernet frames; the payload of TCP and UDP is only
+# dissected by scapy when scapy has a layer bound to its ports, so plain
+# data costs nothing. Frames pktheaders doesn't handle, and tunnels, are
+# dissected whole as before.
+def frame_keys(data, cls):
+    hdr = pktheaders.decode(data) if cls is Ether else None
+    if hdr is None:
+        return packet_keys(cls(data))
+
+    layers = hdr.layers
+    url = None
+    names = None
+    if hdr.payload:
+        pcls, under = __PayloadClass(hdr.l4, hdr.sport, hdr.dport)
+        if pcls is Raw:
+            layers.append('Raw')
+        else:
+            # Dissected the way scapy dissects a payload, falling back to
+            # raw data when the layer can't be
+            try:
+                payload = pcls(bytes(hdr.payload), _internal=1, _underlayer=under)
+            except Exception:
+                payload = Raw(bytes(hdr.payload))
+
+            for layer in (IP, IPv6, TCP, ARP):
+                if layer in payload:
+                    return packet_keys(cls(data))
+
+            layers += [layer.name for layer in __PacketLayers(payload)]
+            url = __HTTPUrl(payload)
+            names = __DNSNames(payload)
+    layers += ['Padding'] * hdr.pads
+
+    https = hdr.l4 == 'TCP' and (hdr.dport == 443 or hdr.sport == 443)
+
+    arp = None
+    if hdr.arp_psrc is not None:
+        arp = (hdr.arp_psrc, hdr.ether_src)
+
+    ports = None
+    if hdr.l4 is not None:
+        ports = (hdr.sport, hdr.dport, hdr.flags)
+
+    counts, times = report_keys(hdr.src, hdr.dst, hdr.v6, layers, https, url, names, arp)
+    return counts, times, ports
+
+# Finds the layer scapy dissects the payload of a TCP or UDP layer with,
+# from the layers bound to its ports. Also returns a TCP or UDP layer with
+# those ports, given to the payload as the layer under it. Cached for the
+# ports seen, up to PAYLOAD_CACHE of them.
+def __PayloadClass(l4, sport, dport):
+    key = (l4, sport, dport)
+    found = payload_cache.get(key)
+    if found is None:
+        if len(payload_cache) >= PAYLOAD_CACHE:
+            payload_cache.clear()
+        under = (TCP if l4 == 'TCP' else UDP)(sport=sport, dport=dport)
+        found = (under.guess_payload_class(b''), under)
+        payload_cache[key] = found
+
+    return found
+
+# Builds the packet table in chunks of TABLE_CHUNK packets: a column of
+# times, wire lengths, ports and TCP flags, and a column of key IDs per
+# report key (see TABLE_COLUMNS). Each key column has its own dictionary
+# of keys, numbered in the order they were first seen, and -1 marks a
+# packet without that key. The dictionaries are kept across chunks, the
+# rows are handed over by chunk() and then dropped.
+class PacketTable:
+    def __init__(self):
+        self.keys = {column: {} for column in KEY_COLUMNS}
+        self.__Clear()
+
+    def __Clear(self):
+        self.rows = 0
+        self.ts = []
+        self.length = []
+        self.sport = []
+        self.dport = []
+        self.flags = []
+        self.columns = {column: [] for column, report, source in TABLE_COLUMNS}
+        # Every DNS answer of the chunk, a packet can have several
+        self.dns_names = []
+
+    # Numbers a key of a key column
+    def __ID(self, column, key):
+        if key is None:
+            return -1
+        ids = self.keys[column]
+        found = ids.get(key)
+        if found is None:
+            found = len(ids)
+            ids[key] = found
+        return found
+
+    # Adds a packet, from its time, wire length and what frame_keys() found
+    def add(self, ts, length, counts, times, ports):
+        self.rows += 1
+        self.ts.append(ts)
+        self.length.append(length)
+        if ports is None:
+            ports = (-1, -1, 0)
+        self.sport.append(ports[0])
+        self.dport.append(ports[1])
+        self.flags.append(ports[2])
+
+        for column, report, source in TABLE_COLUMNS:
+            keys = times if source == 'time' else counts
+            key = keys.get(report)
+            if key is not None and source == 'count':
+                key = key[0]
+            self.columns[column].append(self.__ID(column, key))
+
+        for name in counts.get('DNS', ()):
+            self.dns_names.append(self.__ID('dns_names', name))
+
+    # Returns the rows added since the last call as NumPy arrays, by column
+    def chunk(self):
+        arrays = {
+            'ts':           np.array(self.ts, dtype=np.float64),
+            'length':       np.array(self.length, dtype=np.int32),
+            'sport':        np.array(self.sport, dtype=np.int32),
+            'dport':        np.array(self.dport, dtype=np.int32),
+            'flags':        np.array(self.flags, dtype=np.uint16),
+            'dns_names':    np.array(self.dns_names, dtype=np.int32)
+        }
+        for column, report, source in TABLE_COLUMNS:
+            arrays[column] = np.array(self.columns[column], dtype=np.int32)
+
+        self.__Clear()
+        return arrays
+
+# Counts the keys of a count report from one column of the packet table.
+# Keys are handed to the report in the order they were first seen.
+class CountAccumulator:
+    def __init__(self, name, title, index, filename, rotate, column):
+        self.name = name
+        self.title = title
+        self.index = index
+        self.filename = filename
+        self.rotate = rotate
+        self.column = column
+        self.cnt = np.zeros(0, dtype=np.int64)
+
+    def add(self, table, chunk):
+        ids = chunk[self.column]
+        ids = ids[ids >= 0]
+        size = max(len(self.cnt), len(table.keys[self.column]))
+        self.cnt = np.pad(self.cnt, (0, size - len(self.cnt)))
+        self.cnt += np.bincount(ids, minlength=size)
+
+    def report(self, table):
+        cnt = Counter()
+        for key, count in zip(table.keys[self.column], self.cnt.tolist()):
+            if count > 0:
+                cnt[key] = count
+        count_report(self.title, self.index, self.filename, cnt, self.rotate)
+
+# Counts the keys of a time report in the ten bins ending at bins, from one
+# column of the packet table. Each packet goes in the first bin ending at or
+# after its time, packets past the last bin (float rounding of the bin
+# edges) in the last one. Rows are kept in the order their key was first
+# seen.
+class TimeAccumulator:
+    def __init__(self, name, title, dex, filename, column, bins):
+        self.name = name
+        self.title = title
+        self.dex = dex
+        self.filename = filename
+        self.column = column
+        self.bins = np.array(bins)
+        self.edges = bins
+        self.data = np.zeros((0, 10), dtype=np.int64)
+
+    def add(self, table, chunk):
+        ids = chunk[self.column]
+        found = ids >= 0
+        ids = ids[found]
+        slots = np.searchsorted(self.bins, chunk['ts'][found], side='left')
+        slots = np.minimum(slots, len(self.bins) - 1)
+
+        size = len(table.keys[self.column])
+        self.data = np.pad(self.data, ((0, size - len(self.data)), (0, 0)))
+
+        counts = np.bincount(ids * 10 + slots, minlength=size * 10)
+        self.data += counts.reshape(size, 10)
+
+    def report(self, table):
+        data = []
+        for key, row in zip(table.keys[self.column], self.data.tolist()):
+            if sum(row) > 0:
+                data.append([key] + row)
+        time_report(self.title, self.dex, self.filename, data, self.edges)
+
+# Creates the accumulators of every report, in the order they're printed.
+# bins are the ends of the ten time bins.
+def register_reports(bins):
+    reports = []
+    for count, timed in zip(COUNT_REPORTS, TIME_REPORTS):
+        reports.append(CountAccumulator(*count, COUNT_COLUMNS[count[0]]))
+        reports.append(TimeAccumulator(*timed, TIME_COLUMNS[timed[0]], bins))
+
+    return reports
+
+# Collects the statistics in a single pass over packets, which yields the
+# time, wire length, report keys and ports of each packet. They are put in
+# the packet table, and every TABLE_CHUNK packets the reports are counted
+# from the table's columns with NumPy. first and last are the times of the
+# first and last packet. packets can be a generator, memory doesn't grow
+# with the number of packets, only with the number of different keys.
+def __GetStats(packets, first, last):
+    load_reporting()
+    table = PacketTable()
+    table_reports(table, __TableChunks(table, packets), first, last)
+
+# Puts packets in the packet table, yielding its rows every TABLE_CHUNK
+# packets and once more at the end
+def __TableChunks(table, packets):
+    for ts, length, counts, times, ports in packets:
+        table.add(ts, length, counts, times, ports)
+        if table.rows == TABLE_CHUNK:
+            yield table.chunk()
+    yield table.chunk()
+
+# Counts chunks of the packet table in every report and prints them. first
+# and last are the times of the first and last packet, the capture is split
+# into ten time bins between them.
+def table_reports(table, chunks, first, last):
+    print("Capture Start:\n" + convert_ts(first))
+    print("Capture End:\n" + convert_ts(last))
+
+    # Ends of the ten time bins the capture is split into
+    per = (last - first) / 10
+    bins = [first + (per * i) for i in range(1, 11)]
+
+    reports = register_reports(bins)
+    for chunk in chunks:
+        for acc in reports:
+            acc.add(table, chunk)
+
+    for acc in reports:
+        acc.report(table)
 
 # Get a list of sessions.
 def __SessionInfo(packets):
@@ -219,384 +578,64 @@ def __SessionInfo(packets):
     for sess in sessions:
         print(sess)
 
-# Analyzes the provided packets, calculates the ammount
-# of Layer 3 type packets overall and generates a table 
-# and a graph displaying the data.
-def __L3_Count(packets):
-    title = 'Layer 3 Packet Count'
-    index = 'L3 Types'
-    filename = 'L3Type_Count.png'
-
-    L3_types = []
-
-    for pkt in packets:
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 2:
-            L3_types.append(layers[1])
-
-    cnt = Counter()
-
-    for L3 in L3_types:
-        cnt[L3] += 1
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    for L3, count in cnt.most_common():
-        table.add_row([L3, count])
-    print(table) 
-
-    df = pd.DataFrame(L3_types, columns = [index])
-    __GraphingCount(df, index, filename, 0)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of Layer 4 type packets overall and generates a table 
-# and a graph displaying the data.
-def __L4_Count(packets):
-    title = 'Layer 4 Packet Count'
-    index = 'L4 Types'
-    filename = 'L4Type_Count.png'
-
-    L4_types = []
-
-    for pkt in packets:
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 3:
-            L4_types.append(layers[2])
-            
-
-    cnt = Counter()
-
-    for L4 in L4_types:
-        cnt[L4] += 1
-
+#----------------[Live Stats]----------------
+# The base capture keeps the report aggregates up to date while packets
+# arrive, so the report can be printed as soon as the scan stops instead of
+# reading the whole capture back from disk.
+
+# Most fine time bins the packets seen so far are split into while
+# capturing, and the width of the fine bins to start with (the microseconds
+# kept in the capture file). They are folded into the ten report bins once
+# the first and last packet times are known.
+LIVE_BINS = 1000
+LIVE_WIDTH = 0.000001
+
+# Prints the table of a count report and saves its graph. The counts of a
+# sampled capture are scaled up first.
+def count_report(title, index, filename, cnt, rotate):
+    if scale != 1:
+        cnt = Counter({key: count * scale for key, count in cnt.items()})
+
+    load_reporting()
     print("\n" + title)
     table = PrettyTable([index, "Count"])
 
-    for L4, count in cnt.most_common():
-        table.add_row([L4, count])
-    print(table) 
-
-    df = pd.DataFrame(L4_types, columns = [index])
-    __GraphingCount(df, index, filename, 90)
-    print("(" + filename + ")\n")
+    for key, count in cnt.most_common():
+        table.add_row([key, count])
 
-# Analyzes the provided packets, calculates the ammount
-# of Layer 5 type packets overall and generates a table 
-# and a graph displaying the data.
-def __L5_Count(packets):
-    title = 'Layer 5 Packet Count'
-    index = 'L5 Types'
-    filename = 'L5Type_Count.png'
-
-    L5_types = []
-
-    for pkt in packets:
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 4:
-            L5_types.append(layers[3])
-
-    cnt = Counter()
-
-    for L5 in L5_types:
-        cnt[L5] += 1
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    data = []
-    for L5, count in cnt.most_common():
-        table.add_row([L5, count])
-        
-    df = pd.DataFrame(L5_types, columns = [index])
     print(table)
-    __GraphingCount(df, index, filename, 90)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of HTTP/HTTPS type packets overall and generates a table 
-# and a graph displaying the data.
-def __HTTP_Count(packets):
-    title = 'Top HTTP/HTTPS Requests'
-    index = 'Request'
-    filename = ''
-
-    httpconvo = []
-
-    for pkt in packets:
-        if TCP in pkt and (str(pkt[TCP].dport) == "443" or str(pkt[TCP].sport) == "443"):
-            if IP in pkt:
-                ip = pkt[IP].src
-                dest = pkt[IP].dst
-            elif IPv6 in pkt:
-                ip = pkt[IPv6].src
-                dest = pkt[IPv6].dst
-
-            httpconvo.append(ip + " -> https:" + dest)
-        elif pkt.haslayer(HTTPRequest):
-            try:
-                url = pkt[HTTPRequest].Host.decode() + pkt[HTTPRequest].Path.decode()
-                if IP in pkt:
-                    ip = pkt[IP].src
-                elif IPv6 in pkt:
-                    ip = pkt[IPv6].src
-                
-                httpconvo.append(ip + " -> " + url)
-            except:
-                pass
-        
-    cnt = Counter()
-
-    for convos in httpconvo:
-        cnt[convos] += 1
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
 
-    for request, count in cnt.most_common():
-        table.add_row([request,count])
-    
-    print(table)
-   
-# Analyzes the provided packets, calculates the ammount
-# of DNS type packets overall and generates a table 
-# and a graph displaying the data.   
-def __DNS_Count(packets):
-    title = 'Top DNS name resolutions'
-    index = 'Name'
-    filename = 'DNSNameRes_Count.png'
-
-    DNSname = []
-    for pkt in packets:
-        if DNS in pkt:
-            for x in range(pkt[DNS].ancount):
-                DNSname.append(pkt[DNSRR][x].rdata)
-
-    cnt = Counter()
-
-    for names in DNSname:
-        cnt[names] += 1
+    if filename != '' and len(cnt) > 0:
+        __GraphingCounter(cnt, index, filename, rotate)
+        print("(" + filename + ")\n")
 
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    for name, count in cnt.most_common():
-        table.add_row([name, count])
-    
-    print(table)
-    df = pd.DataFrame(DNSname, columns = [index])
-    __GraphingCount(df, index, filename, 90)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of ARP type packets overall and generates a table 
-# and a graph displaying the data.
-def __ARP_Count(packets):
-    title = 'Total ARP requests by source'
-    index = 'ARP Source'
-    filename = 'ARPSource_Count.png'
-
-    ARPs = []
-
-    for pkt in packets:
-        if ARP in pkt:
-            ARPs.append(pkt[ARP].psrc + '(' +  pkt[Ether].src + ')')
-
-    cnt = Counter()
-
-    for sources in ARPs:
-        cnt[sources] += 1
-
-    print("\n" + title)
-    table = PrettyTable([index, "Count"])
-
-    for sources, count in cnt.most_common():
-        table.add_row([sources, count])
-    
-    print(table)
-
-    df = pd.DataFrame(ARPs, columns = [index])
-    __GraphingCount(df, index, filename, 0)
-    print("(" + filename + ")\n")
-
-#----------------[Counts over Time]----------------
-# Time Graphs/lists produced:
-# -Total packets from IP source over time
-# -Total packets from IP Destination over time
-# -Total packets with Layer 3 Types over time
-# -Total packets with Layer 4 Types over time
-# -Total packets with Layer 5 Types over time
-# -Total HTTP/HTTPS Requests made from source over time
-# -Total DNS Queries made from source over time
-# -Total ARP reqiests made from source over time
-
-
-# Takes the provided DataFrame, 
-def __GraphingTime(df, index, Title):
+# Produces a count bar graph from already counted data. Bars keep the order
+# in which the keys were first seen.
+def __GraphingCounter(cnt, xName, Title, rotate):
     global savepath
-    sns.set()
+    sns.set_palette(sns.color_palette("magma"))
 
-    plt = df.set_index(index).T.plot(kind='bar', width=1, stacked=True, colormap='magma')
-    
-    plt.legend(loc='center left', bbox_to_anchor=(1,0.5), fontsize=7)
+    plt = sns.barplot(x = list(cnt.keys()), y = list(cnt.values()), order = list(cnt.keys()))
+    plt.set_xlabel(xName)
+    plt.set_ylabel("count")
 
-    plt.set_xlabel("Timestamp")
-    plt.set_ylabel("Count")
-    plt.tick_params(labelsize=7)
+    plt.set_xticklabels(plt.get_xticklabels(), fontsize=7, rotation=rotate)
+    for p in plt.patches:
+        plt.annotate(format(p.get_height(), '.0f'), (p.get_x() + p.get_width() / 2.,
+        p.get_height()), ha = 'center', va = 'center', xytext = (0, 5),
+        textcoords = 'offset points', fontsize=7)
 
     plt.figure.savefig((savepath + "/" + Title), bbox_inches = "tight")
     plt.figure.clf()
-    
-# Reads the start and end of the capture, divides the total
-# elapsed time into ten sections and returns the timestamp
-# periods and an empty data array.
-def __TS_Range(packets):
-    data = []
-    times = []
-    ts = []
-
-    for pkt in packets:
-        times.append(float(pkt.time))
-    times.sort()
-
-    diff = float(times[-1]) - float(times[0])
-    per = diff/10
-
-    for i in range(1,11):
-        stamp = float(times[0]) + (per * i)
-        ts.append(stamp)
-
-    return data, ts
-
-    
-# Analyzes the provided packets, calculates the ammount
-# of packets from an IP source over a period of time and 
-# generates a table and a graph displaying the data.
-def __IPsrc_Time(packets):
-    title = 'IP Sources over Time'
-    dex = 'IP Source'
-    filename = 'IPSource_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-        if IP in pkt:
-            addr = pkt[IP].src
-            found1 = True
-        elif IPv6 in pkt:
-            addr = pkt[IPv6].src
-            found1 = True
-        
-        # If the IP type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == addr:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [addr,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == addr:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [addr,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
-
-
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
 
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-    #------------------------------------------------------------
-
-# Analyzes the provided packets, calculates the ammount
-# of packets sent to an IP over a period of time and 
-# generates a table and a graph displaying the data.
-def __IPdest_Time(packets):
-    title = 'IP Destinations over Time'
-    dex = 'IP Destination'
-    filename = 'IPDest_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-        if IP in pkt:
-            addr = pkt[IP].dst
-            found1 = True
-        elif IPv6 in pkt:
-            addr = pkt[IPv6].dst
-            found1 = True
-        
-        # If the IP type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == addr:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [addr,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == addr:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [addr,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
+# Prints the table of a time report and saves its graph. data holds a
+# [key, bin1, ..., bin10] row per key and ts the end of each bin. The counts
+# of a sampled capture are scaled up first.
+def time_report(title, dex, filename, data, ts):
+    if scale != 1:
+        data = [[row[0]] + [count * scale for count in row[1:]] for row in data]
 
-    
+    load_reporting()
     timestamps = [dex]
     for i in range(10):
         timestamps.append(convert_ts(ts[i]))
@@ -609,470 +648,181 @@ def __IPdest_Time(packets):
 
     # Sends the dataframe to __GraphingTime() to generate a png
     # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of Layer 3 packet types over time and generates a table 
-# and a graph displaying the data.
-def __L3_Time(packets):
-    title = 'Layer 3 Packets over Time'
-    dex = 'L3 Types'
-    filename = 'L3Type_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 2:
-            L3 = layers[1]
-            found1 = True
-        
-        # If the IP type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == L3:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [L3,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == L3:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [L3,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
-
-
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-    
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
-
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of Layer 4 packet types over time and generates a table 
-# and a graph displaying the data.
-def __L4_Time(packets):
-    title = 'Layer 4 Packets over Time'
-    dex = 'L4 Types'
-    filename = 'L4Type_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 3:
-            L4 = layers[2]
-            found1 = True
-        
-        # If the IP type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == L4:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [L4,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == L4:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [L4,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
-
-
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-    
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
-
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of Layer 5 packet types over time and generates a table 
-# and a graph displaying the data.
-def __L5_Time(packets):
-    title = 'Layer 5 Packets over Time'
-    dex = 'L5 Types'
-    filename = 'L5Type_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        layers = __GetPktLayers(pkt)
-        if len(layers) >= 4:
-            L5 = layers[3]
-            found1 = True
-        
-        # If the L5 type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == L5:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [L5,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == L5:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [L5,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
-
-
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-    
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
-
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of HTTP/HTTPS packet types over time and generates a table 
-# and a graph displaying the data.
-def __HTTP_Time(packets):
-    title = 'HTTP/HTTPS Packets over Time'
-    dex = 'HTTP-HTTPS'
-    filename = 'HTTP-HTTPS_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        if TCP in pkt and (str(pkt[TCP].dport) == "443" or str(pkt[TCP].sport) == "443"):
-            if IP in pkt:
-                dest = pkt[IP].dst
-                http = "https:\n" + dest
-                found1 = True
-            elif IPv6 in pkt:
-                dest = pkt[IPv6].dst
-                http = "https:" + dest
-                found1 = True
-
-        elif pkt.haslayer(HTTPRequest):
-            try:
-                url = pkt[HTTPRequest].Host.decode() + pkt[HTTPRequest].Path.decode()
-                http = url
-                found1 = True
-            except:
-                pass
-
-        
-        # If the url is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == http:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [http,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == http:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [http,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
-
-
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-    
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
-
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of DNS packets over time and generates a table and a 
-# graph displaying the data.
-def __DNS_Time(packets):
-    title = 'DNS Packets over Time'
-    dex = 'Names'
-    filename = 'DNS_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        if DNS in pkt:
-            for x in range(pkt[DNS].ancount):
-                DNSname = pkt[DNSRR][x].rdata
-                found1 = True
-        
-        # If the L5 type is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == DNSname:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [DNSname,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == DNSname:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [DNSname,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
+    if len(data) > 0:
+        __GraphingTime(df, dex, filename)
+        print("(" + filename + ")\n")
 
+# Produces a stacked bar graph over time from the provided DataFrame.
+def __GraphingTime(df, index, Title):
+    global savepath
+    sns.set()
 
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
+    plt = df.set_index(index).T.plot(kind='bar', width=1, stacked=True, colormap='magma')
     
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
-
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
-
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-
-# Analyzes the provided packets, calculates the ammount
-# of ARP packets over time and generates a table and a 
-# graph displaying the data.
-def __ARP_Time(packets):
-    title = 'ARP Packets over Time'
-    dex = 'Source'
-    filename = 'ARP_OverTime.png'
-
-    data, ts = __TS_Range(packets)
-
-    for pkt in packets:
-        found1 = False
-
-        if ARP in pkt:
-            ARPs = pkt[ARP].psrc + '\n' +  pkt[Ether].src
-            found1 = True
-        
-        # If the ARP name is found
-        if found1 == True:
-            # If the timestamp is within the timerange
-            found2 = False
-            for i in range(len(ts)):
-                if float(pkt.time) <= float(ts[i]):
-                    found2 = True
-                    found3 = False
-                    for j in range(len(data)):
-                        if data[j][0] == ARPs:
-                            found3 = True
-                            data[j][i+1] += 1
-                            break
-
-                    # If the addr is not already in the list        
-                    if found3 == False:
-                        a = [ARPs,0,0,0,0,0,0,0,0,0,0]
-                        a[i+1] += 1
-                        data.append(a)
-                    break
-
-            if found2 == False:
-                found3 = False
-                for j in range(len(data)):
-                    if data[j][0] == ARPs:
-                        found3 = True
-                        data[j][len(ts)-1] += 1
-                        break
-
-                # If the addr is not already in the list        
-                if found3 == False:
-                    a = [ARPs,0,0,0,0,0,0,0,0,0,1]
-                    data.append(a)
-                break
+    plt.legend(loc='center left', bbox_to_anchor=(1,0.5), fontsize=7)
 
+    plt.set_xlabel("Timestamp")
+    plt.set_ylabel("Count")
+    plt.tick_params(labelsize=7)
 
-    timestamps = [dex]
-    for i in range(10):
-        timestamps.append(convert_ts(ts[i]))
-    
-    # Create a dataframe to use for graphing the data
-    df = pd.DataFrame(columns=timestamps, data=data)
+    plt.figure.savefig((savepath + "/" + Title), bbox_inches = "tight")
+    plt.figure.clf()
 
-    print("\n" + title)
-    print(tabulate(df, headers=timestamps, tablefmt='pretty'))
+# Collects the report aggregates one packet at a time during a capture,
+# in memory that grows with the number of keys, not packets. The counts are
+# exact. Time reports are kept per key in fine bins, which are doubled in
+# width whenever the packets seen so far span more than LIVE_BINS of them,
+# so a fine bin stays under a thousandth of the capture. They are folded
+# into the ten report bins at the end, by the middle of each fine bin.
+class LiveStats:
+    def __init__(self, rate=1):
+        load_scapy()
+
+        # Sampling rate of the capture, the report is scaled by it
+        self.rate = rate
+
+        self.packets = 0
+        self.first = None
+        self.last = None
+
+        # Fine bins are numbered from the time of the first packet
+        self.origin = None
+        self.width = LIVE_WIDTH
+
+        self.counts = defaultdict(Counter)
+        self.times = defaultdict(lambda: defaultdict(Counter))
+
+    # Adds one dissected packet to every report
+    def add(self, pkt):
+        counts, times, ports = packet_keys(pkt)
+        self.__Count(float(pkt.time), counts, times)
+
+    # Adds one frame of the given link layer class, captured but not
+    # dissected, to every report
+    def add_frame(self, raw, ts, cls):
+        counts, times, ports = frame_keys(raw, cls)
+        self.__Count(float(ts), counts, times)
+
+    def __Count(self, ts, counts, times):
+        # Rounded to the microseconds kept in the capture file, the way
+        # the times are read back from it
+        sec, usec = split_ts(ts)
+        ts = (sec * 1000000 + usec) / 1000000
+
+        if self.origin is None:
+            self.origin = ts
+        if self.first is None or ts < self.first:
+            self.first = ts
+        if self.last is None or ts > self.last:
+            self.last = ts
+        self.packets += 1
+
+        while self.last - self.first >= self.width * LIVE_BINS:
+            self.__Widen()
+        fine = int((ts - self.origin) // self.width)
+
+        for name in counts:
+            cnt = self.counts[name]
+            for key in counts[name]:
+                cnt[key] += 1
+        for name in times:
+            self.times[name][times[name]][fine] += 1
+
+    # Doubles the width of the fine bins, merging them in pairs
+    def __Widen(self):
+        self.width *= 2
+        for keys in self.times.values():
+            for key, fine_bins in keys.items():
+                merged = Counter()
+                for fine, count in fine_bins.items():
+                    merged[fine // 2] += count
+                keys[key] = merged
+
+    # Folds the fine bins of a time report into the ten report bins
+    def __TimeData(self, name, ts):
+        data = []
+        for key, fine_bins in self.times[name].items():
+            row = [key, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+            for fine, count in fine_bins.items():
+                # Middle of the fine bin, kept within the capture
+                mid = self.origin + (fine + 0.5) * self.width
+                mid = min(max(mid, self.first), self.last)
+                i = min(bisect.bisect_left(ts, mid), 9)
+                row[i + 1] += count
+            data.append(row)
+
+        return data
+
+    # Prints every report, saving the graphs in path
+    def report(self, path):
+        global savepath
+        global scale
+        savepath = path
+        scale = self.rate
+
+        print("Save path: " + savepath)
+        if self.packets == 0:
+            print("No packets were captured.")
+            return
+        if scale != 1:
+            print("Sampled capture, counts are scaled up by " + str(scale) + ".")
+
+        print("Capture Start:\n" + convert_ts(self.first))
+        print("Capture End:\n" + convert_ts(self.last))
+
+        per = (self.last - self.first) / 10
+        ts = [self.first + (per * i) for i in range(1, 11)]
+
+        for count, timed in zip(COUNT_REPORTS, TIME_REPORTS):
+            name, title, index, filename, rotate = count
+            count_report(title, index, filename, self.counts[name], rotate)
+
+            name, title, dex, filename = timed
+            time_report(title, dex, filename, self.__TimeData(name, ts), ts)
+
+# Creates the folder the graphs of a capture are saved in. It is named after
+# the capture file and placed next to it.
+def stats_dir(PCAP):
+    pathname, filename = os.path.split(PCAP)
+
+    # Will save to the same path as the PCAP file
+    path = pathname + "/"
+    name = capture_stem(filename)
+
+    # If the graphs folder already exists, then try to make
+    # a folder to sort our different stats based on the filename
+    if os.path.exists((path + name)):
+        i = 1
+        while os.path.exists((path + name + str(i))):
+            i += 1
+        path = (path + name + str(i))
+        os.mkdir(path)
+    else:
+        path = path + name
+        os.mkdir(path)
 
-    # Sends the dataframe to __GraphingTime() to generate a png
-    # graph.
-    __GraphingTime(df, dex, filename)
-    print("(" + filename + ")\n")
-        
+    return path
 
 #----------------------------------[Main]--------------------------------------
+# Usage: pcapstats.py <pcap> [start] [end]
+# start and end limit the stats to a time range of the capture.
 def __Main():
     global savepath
+    global scale
     if len(sys.argv) > 1:
         # Where to find the PCAP file to analyze
         PCAP = sys.argv[1]
 
+        start = parse_time(sys.argv[2]) if len(sys.argv) > 2 else None
+        end = parse_time(sys.argv[3]) if len(sys.argv) > 3 else None
+
         # Verify that the provided PCAP file is valid
         if ispath(PCAP) == False:
             print("[*] Error: Unknown path")
             sys.exit()
 
         # Determining where to store the graphs
-        # Split where to find the PCAP into path and file
-        pathname, filename = os.path.split(PCAP)
-
-        # Will save to the same path as the PCAP file
-        savepath = pathname + "/"
-        name = filename.replace(".pcap", '')
-        g_exist = False
-
-
-        # If the graphs folder already exists, then try to make
-        # a folder to sort our different stats based on the filename
-        if os.path.exists((savepath + name)):
-            i = 1
-            while os.path.exists((savepath + name + str(i))):
-                i += 1
-            savepath = (savepath + name + str(i))
-            os.mkdir(savepath)
-        else:
-            savepath = savepath + name
-            os.mkdir(savepath)
+        savepath = stats_dir(PCAP)
 
         os.system("sudo chmod -R a+rw " + savepath)
             
@@ -1086,12 +836,35 @@ def __Main():
 
 
     print("Save path: " + savepath)
-    packets = __ReadPCAP(PCAP)
-    __GetStats(packets)
+
+    # Counts of a sampled capture are scaled back up by its sampling rate
+    meta = read_meta(PCAP)
+    scale = int(meta.get('sample_rate', 1))
+    if scale != 1:
+        print("Sampled capture (" + meta['sample_mode'] + " 1 in " + str(scale) +
+              "), counts are scaled up by " + str(scale) + ".")
+
+    # The capture is streamed from disk twice: once for the times only, to
+    # place the time bins, then once dissecting each packet for the reports
+    try:
+        count, first, last = __TimeSpan(PCAP, start, end)
+    except ValueError as err:
+        print("[*] Error: " + str(err))
+        sys.exit()
+    if count == 0:
+        if start is None and end is None:
+            print("No packets in the capture.")
+        else:
+            print("No packets in the time range.")
+        sys.exit()
+    __GetStats(__StreamPCAP(PCAP, start, end), first, last)
     
     os.system("sudo chmod -R a+rw {}".format(savepath))
 
 
 #-----------------------------------[Run]--------------------------------------
-__Main()
+# Only runs the analysis when started as a script, so the base capture can
+# import the reports.
+if __name__ == '__main__':
+    __Main()
 #------------------------------------------------------------------------------
\ No newline at end of file
@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import socket
+import struct
+
+#---------------------------------[Globals]------------------------------------
+# Header layouts, in network byte order
+ETHER_HDR = struct.Struct('!6s6sH')
+VLAN_HDR = struct.Struct('!HH')
+# hwtype, ptype, hwlen, plen, op, hwsrc, psrc, hwdst, pdst
+ARP_HDR = struct.Struct('!HHBBH6s4s6s4s')
+# version/ihl, tos, len, id, flags/frag, ttl, proto, chksum, src, dst
+IPV4_HDR = struct.Struct('!BBHHHBBH4s4s')
+# version/tc/fl, plen, nh, hlim, src, dst
+IPV6_HDR = struct.Struct('!IHBB16s16s')
+# sport, dport, seq, ack, dataofs/reserved/NS, flags
+TCP_HDR = struct.Struct('!HHIIBB')
+# sport, dport, len, chksum
+UDP_HDR = struct.Struct('!HHHH')
+# type, code, chksum, id, seq
+ICMP_HDR = struct.Struct('!BBHHH')
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86dd
+ETH_ARP = 0x0806
+ETH_VLAN = 0x8100
+
+# ICMP types with an id and seq and no quoted packet (echo reply/request)
+ICMP_ECHO = (0, 8)
+
+#--------------------------------[Functions]-----------------------------------
+# Parses the Ethernet, 802.1Q, ARP, IPv4, IPv6, TCP, UDP and ICMP echo
+# headers of an Ethernet frame straight from its bytes, a lot quicker than
+# dissecting it with scapy. The layers are named and split the way scapy
+# dissects them, padding included. Returns None for anything it doesn't
+# handle the same way (other protocols, IP options, IPv6 extension headers,
+# 802.3 frames, truncated or malformed headers), which is left to scapy.
+# The payload of TCP and UDP is not parsed.
+def decode(raw):
+    if len(raw) < ETHER_HDR.size:
+        return None
+
+    dst, src, ethertype = ETHER_HDR.unpack_from(raw, 0)
+    if ethertype <= 1500:
+        return None
+
+    hdr = Headers()
+    hdr.ether_src = src.hex(':')
+    hdr.layers.append('Ethernet')
+
+    off = ETHER_HDR.size
+    while ethertype == ETH_VLAN:
+        if len(raw) < off + VLAN_HDR.size:
+            return None
+        tci, ethertype = VLAN_HDR.unpack_from(raw, off)
+        if ethertype <= 1500:
+            return None
+        hdr.layers.append('802.1Q')
+        off += VLAN_HDR.size
+
+    if off == len(raw):
+        return hdr
+    if ethertype == ETH_ARP:
+        return __DecodeARP(hdr, raw, off)
+    if ethertype == ETH_IPV4:
+        return __DecodeIPv4(hdr, raw, off)
+    if ethertype == ETH_IPV6:
+        return __DecodeIPv6(hdr, raw, off)
+    return None
+
+# ARP of IPv4 over Ethernet. Whatever follows is padding.
+def __DecodeARP(hdr, raw, off):
+    if len(raw) < off + ARP_HDR.size:
+        return None
+
+    hwtype, ptype, hwlen, plen, op, hwsrc, psrc, hwdst, pdst = ARP_HDR.unpack_from(raw, off)
+    if hwtype != 1 or ptype != ETH_IPV4 or hwlen != 6 or plen != 4:
+        return None
+
+    hdr.layers.append('ARP')
+    hdr.arp_psrc = socket.inet_ntoa(psrc)
+    if len(raw) > off + ARP_HDR.size:
+        hdr.pads += 1
+    return hdr
+
+# IPv4 without options. Bytes past its total length are padding. Fragments
+# after the first carry no transport header.
+def __DecodeIPv4(hdr, raw, off):
+    if len(raw) < off + IPV4_HDR.size:
+        return None
+
+    ver_ihl, tos, length, ident, frag, ttl, proto, chksum, src, dst = \
+        IPV4_HDR.unpack_from(raw, off)
+    if ver_ihl != 0x45 or length < IPV4_HDR.size:
+        return None
+
+    hdr.layers.append('IP')
+    hdr.src = socket.inet_ntoa(src)
+    hdr.dst = socket.inet_ntoa(dst)
+
+    end = off + length
+    if len(raw) > end:
+        hdr.pads += 1
+    data = raw[off + IPV4_HDR.size:end]
+
+    if frag & 0x1fff:
+        if data:
+            hdr.layers.append('Raw')
+        return hdr
+    return __DecodeTransport(hdr, proto, data)
+
+# IPv6 without extension headers. Bytes past its payload length are padding.
+def __DecodeIPv6(hdr, raw, off):
+    if len(raw) < off + IPV6_HDR.size:
+        return None
+
+    ver_tc_fl, plen, nh, hlim, src, dst = IPV6_HDR.unpack_from(raw, off)
+    if ver_tc_fl >> 28 != 6 or (plen == 0 and nh == 0):
+        return None
+
+    hdr.layers.append('IPv6')
+    hdr.src = socket.inet_ntop(socket.AF_INET6, src)
+    hdr.dst = socket.inet_ntop(socket.AF_INET6, dst)
+    hdr.v6 = True
+
+    end = off + IPV6_HDR.size + plen
+    if len(raw) > end:
+        hdr.pads += 1
+    data = raw[off + IPV6_HDR.size:end]
+
+    if nh == 1:
+        # ICMP (not ICMPv6) is only bound over IPv4
+        return None
+    return __DecodeTransport(hdr, nh, data)
+
+# TCP, UDP or ICMP echo, in the payload of an IP layer. The TCP and UDP
+# payload is kept for the caller, an ICMP echo's data is raw.
+def __DecodeTransport(hdr, proto, data):
+    if not data:
+        return hdr
+
+    if proto == 6:
+        if len(data) < TCP_HDR.size:
+            return None
+        sport, dport, seq, ack, dataofs, flags = TCP_HDR.unpack_from(data, 0)
+        size = (dataofs >> 4) * 4
+        if size < 20 or size > len(data):
+            return None
+        hdr.layers.append('TCP')
+        hdr.flags = (dataofs & 1) << 8 | flags
+        hdr.payload = data[size:]
+
+    elif proto == 17:
+        if len(data) < UDP_HDR.size:
+            return None
+        sport, dport, length, chksum = UDP_HDR.unpack_from(data, 0)
+        if length < UDP_HDR.size:
+            return None
+        hdr.layers.append('UDP')
+        hdr.payload = data[UDP_HDR.size:length]
+        if len(data) > length:
+            hdr.pads += 1
+
+    elif proto == 1 and len(data) >= ICMP_HDR.size and data[0] in ICMP_ECHO:
+        hdr.layers.append('ICMP')
+        if len(data) > ICMP_HDR.size:
+            hdr.layers.append('Raw')
+        return hdr
+
+    else:
+        return None
+
+    hdr.l4 = hdr.layers[-1]
+    hdr.sport = sport
+    hdr.dport = dport
+    return hdr
+
+#---------------------------------[Classes]------------------------------------
+# Header fields of a decoded frame:
+# layers - Names of the layers parsed, outermost first, as scapy names them.
+# pads - Number of padding layers scapy adds after the last layer.
+# src, dst, v6 - Addresses of the IP or IPv6 layer (None without one).
+# l4, sport, dport, payload - Name, ports and payload bytes of a TCP or UDP
+#                             layer (l4 is None without one).
+# flags - TCP flags (0 for UDP).
+# ether_src, arp_psrc - Source MAC, and source IP of an ARP packet.
+class Headers:
+    __slots__ = ('layers', 'pads', 'src', 'dst', 'v6', 'l4', 'sport', 'dport', 'payload',
+                 'flags', 'ether_src', 'arp_psrc')
+
+    def __init__(self):
+        self.layers = []
+        self.pads = 0
+        self.src = None
+        self.dst = None
+        self.v6 = False
+        self.l4 = None
+        self.sport = None
+        self.dport = None
+        self.payload = b''
+        self.flags = 0
+        self.ether_src = None
+        self.arp_psrc = None
+
+#------------------------------------------------------------------------------
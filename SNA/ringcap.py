@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import mmap
+import select
+import socket
+import struct
+
+#---------------------------------[Globals]------------------------------------
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+ETH_P_ALL = 0x0003
+
+# Owner of a block of the ring, in the block_status of its descriptor
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# struct tpacket_req3: block_size, block_nr, frame_size, frame_nr,
+# retire_blk_tov, sizeof_priv, feature_req_word
+TPACKET_REQ3 = struct.Struct('IIIIIII')
+# Start of struct tpacket_block_desc: version, offset_to_priv, then the
+# block_status, num_pkts and offset_to_first_pkt of struct tpacket_hdr_v1
+BLOCK_DESC = struct.Struct('IIIII')
+BLOCK_STATUS = 8
+# Start of struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len,
+# status, mac, net
+TPACKET3_HDR = struct.Struct('IIIIIIHH')
+# The struct sockaddr_ll of a frame follows its 48 byte tpacket3_hdr
+# (aligned to 16 bytes), its sll_pkttype is 10 bytes in
+SLL_PKTTYPE = 48 + 10
+# sll_pkttype of a packet sent by this host
+PACKET_OUTGOING = 4
+
+# Ring of 64 blocks of 1MB. A block is handed over once it is full or
+# RING_TIMEOUT milliseconds after its first frame, so a quiet link still
+# reaches the disk.
+RING_BLOCK_SIZE = 1 << 20
+RING_BLOCKS = 64
+RING_FRAME_SIZE = 2048
+RING_TIMEOUT = 100
+
+#---------------------------------[Classes]------------------------------------
+# Receive ring of a packet socket (PACKET_RX_RING, TPACKET_V3) mapped into
+# memory. The kernel fills whole blocks of frames without any syscall per
+# frame; a block is read once the kernel hands it over and given back with
+# release(). Frames are memoryviews into the ring, they are only valid
+# until their block is released. Like a listening socket, the ring gets the
+# packets the host sends as well, unless outgoing is False.
+class PacketRing:
+    def __init__(self, iface, blocks=RING_BLOCKS, block_size=RING_BLOCK_SIZE, outgoing=True):
+        self.iface = iface
+        self.blocks = blocks
+        self.block_size = block_size
+        self.outgoing = outgoing
+
+        # Named like the socket of a scapy SuperSocket, so the same socket
+        # options (stats, fanout, filters) can be applied to it
+        self.ins = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            self.ins.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frames = block_size // RING_FRAME_SIZE * blocks
+            self.ins.setsockopt(SOL_PACKET, PACKET_RX_RING,
+                                TPACKET_REQ3.pack(block_size, blocks, RING_FRAME_SIZE,
+                                                  frames, RING_TIMEOUT, 0, 0))
+            self.ring = mmap.mmap(self.ins.fileno(), block_size * blocks,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self.ins.bind((iface, ETH_P_ALL))
+        except OSError:
+            self.ins.close()
+            raise
+
+        # ARPHRD type of the interface, which gives the link layer
+        self.hatype = self.ins.getsockname()[3]
+        self.view = memoryview(self.ring)
+        self.block = 0
+
+    def fileno(self):
+        return self.ins.fileno()
+
+    # Waits up to timeout seconds for the kernel to hand over the next
+    # block. Returns its offset in the ring, or None if it isn't ready.
+    def next_block(self, timeout):
+        offset = self.block * self.block_size
+        if not self.__Ready(offset):
+            select.select([self.ins], [], [], timeout)
+            if not self.__Ready(offset):
+                return None
+
+        return offset
+
+    def __Ready(self, offset):
+        return struct.unpack_from('I', self.ring, offset + BLOCK_STATUS)[0] & TP_STATUS_USER
+
+    # Yields (frame, ts_sec, ts_nsec, wirelen) for each frame of a block
+    def frames(self, offset):
+        num_pkts, first = BLOCK_DESC.unpack_from(self.ring, offset)[3:5]
+
+        pos = offset + first
+        for i in range(num_pkts):
+            next_offset, sec, nsec, snaplen, wirelen, status, mac, net = \
+                TPACKET3_HDR.unpack_from(self.ring, pos)
+            if self.outgoing or self.ring[pos + SLL_PKTTYPE] != PACKET_OUTGOING:
+                yield self.view[pos + mac:pos + mac + snaplen], sec, nsec, wirelen
+            pos += next_offset
+
+    # Hands a block back to the kernel and moves on to the next one
+    def release(self, offset):
+        struct.pack_into('I', self.ring, offset + BLOCK_STATUS, TP_STATUS_KERNEL)
+        self.block = (self.block + 1) % self.blocks
+
+    def close(self):
+        self.view.release()
+        try:
+            self.ring.close()
+        except BufferError:
+            # A frame is still referenced, the ring is unmapped once it's gone
+            pass
+        self.ins.close()
+
+#------------------------------------------------------------------------------
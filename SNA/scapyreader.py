@@ -2,55 +2,1004 @@
 #---------------------------------[Imports]------------------------------------
 # Import modules
 from collections import Counter, defaultdict
+import contextlib
 import datetime
+import glob
 from datetime import datetime, timedelta
+import json
 import os
+import curses
+import multiprocessing
 import pickle
+import queue
+import select
+import signal
+import socket
+import struct
+import threading
 import time
 import subprocess
 import sys
 
 # Downloaded modules
-from scapy.all import *
-from scapy.all import sniff, AsyncSniffer
-import scapy.all as scapy
+# scapy is loaded once a capture starts, see load_scapy()
 from termcolor import colored, cprint
 
+# File imports
+from capfile import zstandard
+from flows import FlowCutoff, Sampler
+from ringcap import PacketRing
+from capfile import CapRing, CapWriter, COMPRESS_EXT, DEFAULT_FLUSH, DLT_EN10MB, INDEX_PACKETS, LATENCY_BOUNDS, merge_pcaps, segment_path
+
 #---------------------------------[Globals]------------------------------------
 global SetupComplete
 global BaseComplete
 
+# Default sizes of the queues between the sniffer and the writer/display
+# threads, and the most packet lines printed per second.
+WRITE_QUEUE = '65536'
+DISPLAY_QUEUE = '4096'
+STATS_QUEUE = '65536'
+DISPLAY_RATE = '50'
+
+# Seconds of packets written after a trigger fires, unless set
+TRIGGER_POST = 60
+
+# Seconds the capture processes of a multi-process scan get to finish their
+# captures once stopped, before they are terminated
+WORKER_STOP = 60
+
+# Seconds between checks of the capture writer for a segment to close when
+# the FlushPolicy time is 0. The writer then flushes on every packet, and
+# otherwise is checked every FlushPolicy time.
+WRITER_POLL = 1
+
+# Seconds between refreshes of the dashboard display mode, and the number
+# of capture messages it shows
+DASH_REFRESH = 1
+DASH_NOTICES = 3
+
+# IP protocol numbers named on the dashboard when frames are not dissected
+IP_PROTOS = {1: 'ICMP', 2: 'IGMP', 6: 'TCP', 17: 'UDP', 47: 'GRE', 50: 'ESP', 58: 'ICMPv6'}
+
+# getsockopt of the packet socket receive/drop counters (struct tpacket_stats)
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+TPACKET_STATS = struct.Struct('II')
+
+# Receive counters of the interface, from /sys/class/net/<iface>/statistics
+IFACE_COUNTERS = ('rx_packets', 'rx_bytes', 'rx_dropped', 'rx_errors',
+                  'rx_fifo_errors', 'rx_missed_errors')
+
+# setsockopt making a packet socket skip the packets the host sends
+# (Linux 4.20 and later)
+PACKET_IGNORE_OUTGOING = 23
+
+# setsockopt joining a packet socket to a fanout group. Flows are spread
+# over the group by hash, with fragments reassembled first so they follow
+# their flow.
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+# The group id is the low 16 bits of the option, the mode and flags the high
+# 16. With the defrag flag it's past INT_MAX, so it's passed as bytes.
+FANOUT_ARG = struct.Struct('I')
+
+#--------------------------------[Functions]-----------------------------------
+# Loads the parts of scapy a capture uses. Importing scapy.all takes about a
+# second, most of it loading every protocol layer, which only a dissecting
+# capture needs. Raw and Ring captures get by with the link and IP layers,
+# so the setup screens and the capture daemon start without the wait.
+def load_scapy(dissect=False):
+    global conf, MTU, Raw, Ether, IP, IPv6, AsyncSniffer
+
+    from scapy.config import conf
+    from scapy.data import MTU
+    from scapy.packet import Raw
+    from scapy.layers.l2 import Ether
+    from scapy.layers.inet import IP
+    from scapy.layers.inet6 import IPv6
+    from scapy.sendrecv import AsyncSniffer
+    if dissect:
+        import scapy.layers.all
+
+# Compiles a BPF capture filter for the given interface with tcpdump and
+# returns whether it is valid along with the compiled program (or the error).
+# The same program is attached to the capture socket in the kernel, so
+# filtered out frames never reach Python.
+def check_filter(iface, CapFilter):
+    try:
+        result = subprocess.run(["tcpdump", "-i", iface, "-d", CapFilter],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        return False, ["tcpdump is required to compile capture filters."]
+
+    if result.returncode != 0:
+        return False, result.stderr.decode().strip().split('\n')
+
+    return True, result.stdout.decode().strip().split('\n')
+
+# Reads the packets received and dropped by the kernel for a capture socket
+# since the last call, the kernel resets them on every read. Returns None
+# when the socket has no such counters (not a Linux packet socket).
+def socket_stats(sock):
+    try:
+        stats = sock.ins.getsockopt(SOL_PACKET, PACKET_STATISTICS, TPACKET_STATS.size)
+    except (AttributeError, OSError):
+        return None
+
+    return TPACKET_STATS.unpack(stats)
+
+# Builds the PACKET_FANOUT option value of a fanout group
+def fanout_arg(group):
+    mode = PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG
+    return FANOUT_ARG.pack((group & 0xffff) | (mode << 16))
+
+# Stops a capture socket from getting the packets the host sends. Returns
+# False when the socket can't (not a Linux packet socket, or an older
+# kernel).
+def ignore_outgoing(sock):
+    try:
+        sock.ins.setsockopt(SOL_PACKET, PACKET_IGNORE_OUTGOING, 1)
+    except (AttributeError, OSError):
+        return False
+
+    return True
+
+# Joins a capture socket to fanout group. Every socket of the group gets a
+# share of the interface's flows. Returns False when the socket can't
+# join (not a Linux packet socket, or an older kernel).
+def join_fanout(sock, group):
+    try:
+        sock.ins.setsockopt(SOL_PACKET, PACKET_FANOUT, fanout_arg(group))
+    except (AttributeError, OSError, TypeError):
+        return False
+
+    return True
+
+# Reads the receive counters of an interface. Counters the driver doesn't
+# provide are left out.
+def iface_counters(iface):
+    counters = {}
+    for name in IFACE_COUNTERS:
+        try:
+            with open('/sys/class/net/' + iface + '/statistics/' + name) as f:
+                counters[name] = int(f.read())
+        except (OSError, ValueError):
+            pass
+
+    return counters
+
 #---------------------------------[Classes]------------------------------------
+# Consumer thread fed by the sniffer through a bounded queue. The sniffer
+# never blocks on a slow consumer: when the queue is full the packet is
+# dropped for that consumer and counted as an overflow.
+class PktConsumer(threading.Thread):
+    def __init__(self, name, handler, maxsize, idle=None):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.queue = queue.Queue(maxsize)
+        self.maxsize = maxsize
+        self.handler = handler
+        self.idle = idle
+        self.overflows = 0
+        self.high_water = 0
+
+    # Called from the sniffer thread for every packet
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflows += 1
+            return
+
+        depth = self.queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    # Hands queued packets to the handler until the stop marker is reached.
+    # The idle function is called whenever the queue stays empty for a bit.
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.idle is not None:
+                    self.idle()
+                continue
+
+            if item is None:
+                break
+            self.handler(item)
+
+    # Lets the consumer drain its queue, then waits for it to end
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        if self.idle is not None:
+            self.idle()
+
+# Frame captured without dissection. Holds the raw bytes, the capture
+# timestamp and the link layer class; the scapy Packet is only built when a
+# consumer asks for a decoded view.
+class RawFrame:
+    __slots__ = ('cls', 'raw', 'time', 'wirelen', 'pkt')
+
+    def __init__(self, cls, raw, timestamp, snaplen=0):
+        self.cls = cls
+        self.wirelen = len(raw)
+        self.raw = raw[:snaplen] if snaplen > 0 else raw
+        self.time = timestamp
+        self.pkt = None
+
+    # Dissects the frame on first use
+    def decoded(self):
+        if self.pkt is None:
+            self.pkt = self.cls(self.raw)
+            self.pkt.time = self.time
+        return self.pkt
+
+# Sniffer used by the raw capture mode. Reads frames straight off a
+# listening socket with recv_raw(), skipping scapy's dissection, and hands
+# them to prn as RawFrames. Started and stopped like an AsyncSniffer, the
+# socket is left open for the caller to close.
+# Frames are cut to the snap length as soon as they are read, so only the
+# kept bytes are queued.
+class RawSniffer(threading.Thread):
+    def __init__(self, sock, prn, snaplen=0):
+        threading.Thread.__init__(self, name='rawsniffer', daemon=True)
+        self.sock = sock
+        self.prn = prn
+        self.snaplen = snaplen
+        self.done = threading.Event()
+
+    def run(self):
+        sock = self.sock
+        while not self.done.is_set():
+            if not select.select([sock], [], [], 0.5)[0]:
+                continue
+
+            cls, raw, ts = sock.recv_raw(MTU)
+            # A socket that also sends skips the copies of what it sent
+            if raw is None:
+                continue
+            if ts is None:
+                ts = time.time()
+            self.prn(RawFrame(cls, raw, ts, self.snaplen))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+# Keeps track of the health of a capture: packets the kernel received and
+# dropped on the capture socket, the interface receive counters, how full
+# the queues got and how long writing to the file took. Saved as a JSON
+# sidecar next to the capture when the scan stops.
+class CapHealth:
+    def __init__(self, iface, sock):
+        self.iface = iface
+        self.sock = sock
+        self.dt_start = datetime.now()
+        self.dt_stop = None
+
+        # None until the kernel has given counters for the socket. The
+        # packets received include the ones dropped.
+        self.kernel_pkts = None
+        self.kernel_drops = None
+
+        self.iface_start = iface_counters(iface)
+        self.iface_delta = {}
+
+    # Adds the kernel counters since the last poll. Polled during the scan
+    # so the 32 bit counters can't wrap around.
+    def poll(self):
+        stats = socket_stats(self.sock)
+        if stats is None:
+            return
+
+        if self.kernel_pkts is None:
+            self.kernel_pkts, self.kernel_drops = 0, 0
+        self.kernel_pkts += stats[0]
+        self.kernel_drops += stats[1]
+
+    # Takes the last counters. Called after the sniffer stopped and before
+    # the socket is closed.
+    def finish(self):
+        self.poll()
+        self.dt_stop = datetime.now()
+
+        iface_stop = iface_counters(self.iface)
+        self.iface_delta = {name: iface_stop[name] - self.iface_start[name]
+                            for name in iface_stop if name in self.iface_start}
+
+    # Writes the health of the capture to path as JSON and returns it
+    def save(self, path, captured, writer, consumers):
+        queues = {}
+        for consumer in consumers:
+            queues[consumer.name] = {
+                'size':         consumer.maxsize,
+                'high_water':   consumer.high_water,
+                'overflows':    consumer.overflows
+            }
+
+        latency = {}
+        for i, bound in enumerate(LATENCY_BOUNDS):
+            latency['<=' + str(bound)] = writer.latency[i]
+        latency['>' + str(LATENCY_BOUNDS[-1])] = writer.latency[-1]
+
+        delivered = None
+        if self.kernel_pkts is not None:
+            delivered = self.kernel_pkts - self.kernel_drops
+
+        health = {
+            'interface':            self.iface,
+            'start':                self.dt_start.isoformat(),
+            'stop':                 self.dt_stop.isoformat(),
+            'captured':             captured,
+            'written':              writer.pkts_written,
+            'kernel': {
+                'received':         self.kernel_pkts,
+                'dropped':          self.kernel_drops,
+                'delivered':        delivered
+            },
+            'interface_counters':   self.iface_delta,
+            'queues':               queues,
+            'writer': {
+                'bytes':            writer.bytes_written,
+                'flushes':          sum(writer.latency),
+                'latency_us':       latency,
+                'max_latency_us':   writer.latency_max
+            }
+        }
+
+        with open(path, 'w') as f:
+            json.dump(health, f, indent=4)
+
+        return health
+
+# Sniffer used by the ring capture mode. Frames are read a block at a time
+# out of a PacketRing and written to the capture straight from the ring,
+# so there is no syscall or bytes object per frame on the way to the file.
+# The writer is flushed before each block is given back to the kernel.
+# Frames left out by the sampler are skipped before anything else, frames
+# past the flow cutoff are not written but still shown and counted.
+# prn gets a copy of each frame, as a RawFrame, for the display and stats.
+# Without a prn (nothing to display or count) the frames are never copied
+# out of the ring, they are only added to the packet count.
+class RingSniffer(threading.Thread):
+    def __init__(self, ring, writer, prn, snaplen=0, sampler=None, cutoff=None):
+        threading.Thread.__init__(self, name='ringsniffer', daemon=True)
+        self.ring = ring
+        self.writer = writer
+        self.prn = prn
+        self.snaplen = snaplen
+        self.sampler = sampler
+        self.cutoff = cutoff
+        self.cls = conf.l2types.get(ring.hatype, Raw)
+        self.done = threading.Event()
+
+    def run(self):
+        global pkt_count
+
+        ring = self.ring
+        writer = self.writer
+        prn = self.prn
+        sampler = self.sampler
+        cutoff = self.cutoff
+        if writer.linktype is None:
+            writer.linktype = conf.l2types.layer2num.get(self.cls, DLT_EN10MB)
+
+        while not self.done.is_set():
+            block = ring.next_block(0.5)
+            if block is None:
+                continue
+
+            kept = 0
+            for frame, sec, nsec, wirelen in ring.frames(block):
+                if sampler is not None and not sampler.keep(frame):
+                    continue
+                kept += 1
+                timestamp = sec + nsec / 1000000000
+                if cutoff is None or cutoff.keep(frame, wirelen):
+                    writer.write(frame, timestamp, wirelen)
+                if prn is not None:
+                    prn(RawFrame(self.cls, bytes(frame), timestamp, self.snaplen))
+
+            writer.flush()
+            ring.release(block)
+            if prn is None:
+                pkt_count += kept
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+# Fires the pre-trigger ring of a triggered capture: on any packet matching
+# the trigger filter, when the packet rate reaches rate packets per second,
+# or when its event is set (by a SIGUSR1). The trigger filter is attached
+# to a socket of its own, so the matching is done by the kernel. count
+# gives the number of packets captured so far, and notify is handed a
+# message each time the trigger fires.
+class CapTrigger(threading.Thread):
+    def __init__(self, iface, ring, trigger_filter, rate, count, notify):
+        threading.Thread.__init__(self, name='trigger', daemon=True)
+        self.iface = iface
+        self.ring = ring
+        self.trigger_filter = trigger_filter
+        self.rate = rate
+        self.count = count
+        self.notify = notify
+        self.event = threading.Event()
+        self.done = threading.Event()
+
+    def run(self):
+        sock = None
+        if self.trigger_filter is not None:
+            sock = conf.L2listen(iface=self.iface, filter=self.trigger_filter)
+
+        last_count = self.count()
+        last_time = time.monotonic()
+        try:
+            while not self.done.is_set():
+                if sock is None:
+                    self.event.wait(0.5)
+                elif select.select([sock], [], [], 0.5)[0]:
+                    sock.recv_raw(MTU)
+                    self.__Fire("filter match")
+
+                if self.event.is_set():
+                    self.event.clear()
+                    self.__Fire("signal")
+
+                now = time.monotonic()
+                if now - last_time >= 1:
+                    count = self.count()
+                    pps = (count - last_count) / (now - last_time)
+                    last_count, last_time = count, now
+                    if self.rate > 0 and pps >= self.rate:
+                        self.__Fire(str(int(pps)) + " pkts/s")
+        finally:
+            if sock is not None:
+                sock.close()
+
+    # Writes out the ring, unless it is already triggered
+    def __Fire(self, reason):
+        count = self.ring.trigger()
+        if count is not None:
+            self.notify("Triggered by " + reason + ", saved " + str(count) +
+                        " packets from memory.")
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+# Live dashboard shown instead of one line per packet. The sniffer only bumps
+# a few counters for each packet; the screen is redrawn from them at a fixed
+# rate by this thread.
+class CapDashboard(threading.Thread):
+    def __init__(self, iface, dt_start, dt_run):
+        threading.Thread.__init__(self, name='dashboard', daemon=True)
+        self.iface = iface
+        self.dt_start = dt_start
+        self.dt_run = dt_run
+        self.done = threading.Event()
+
+        self.pkts = 0
+        self.nbytes = 0
+        self.talkers = Counter()
+        self.protocols = Counter()
+
+        # Messages of the capture, printing them would draw over the screen
+        self.notices = []
+
+    # Shows a message of the capture (a saved segment) under the counters
+    def notice(self, message):
+        self.notices = (self.notices + [message])[-DASH_NOTICES:]
+
+    # Called from the sniffer thread for every packet
+    def count(self, Packet):
+        if isinstance(Packet, RawFrame):
+            self.__CountRaw(Packet)
+            return
+
+        self.pkts += 1
+        self.nbytes += len(Packet)
+
+        ip = Packet.getlayer(IP)
+        if ip is None:
+            ip = Packet.getlayer(IPv6)
+
+        if ip is not None:
+            self.talkers[ip.src] += 1
+            self.protocols[ip.payload.name] += 1
+        else:
+            self.protocols[Packet.payload.name] += 1
+
+    # Counts an undissected frame. The source address and protocol are
+    # read from fixed offsets of Ethernet framed IPv4/IPv6 headers.
+    def __CountRaw(self, frame):
+        self.pkts += 1
+        self.nbytes += frame.wirelen
+
+        raw = frame.raw
+        if frame.cls is not Ether or len(raw) < 14:
+            self.protocols[frame.cls.__name__] += 1
+            return
+
+        ethertype = struct.unpack_from('!H', raw, 12)[0]
+        if ethertype == 0x0800 and len(raw) >= 34:
+            self.talkers[socket.inet_ntop(socket.AF_INET, raw[26:30])] += 1
+            self.protocols[IP_PROTOS.get(raw[23], 'IP ' + str(raw[23]))] += 1
+        elif ethertype == 0x86dd and len(raw) >= 54:
+            self.talkers[socket.inet_ntop(socket.AF_INET6, raw[22:38])] += 1
+            self.protocols[IP_PROTOS.get(raw[20], 'IPv6 ' + str(raw[20]))] += 1
+        elif ethertype == 0x0806:
+            self.protocols['ARP'] += 1
+        else:
+            self.protocols[hex(ethertype)] += 1
+
+    # Redraws the dashboard until the scan stops
+    def run(self):
+        from netreader import setupscr, exitscr
+
+        stdscr = curses.initscr()
+        setupscr(stdscr)
+        curses.curs_set(0)
+
+        last_pkts = 0
+        last_bytes = 0
+        last_time = time.monotonic()
+
+        while not self.done.wait(DASH_REFRESH):
+            now = time.monotonic()
+            pkts = self.pkts
+            nbytes = self.nbytes
+            pps = (pkts - last_pkts) / (now - last_time)
+            bps = (nbytes - last_bytes) * 8 / (now - last_time)
+            last_pkts, last_bytes, last_time = pkts, nbytes, now
+
+            self.__Draw(stdscr, pkts, nbytes, pps, bps)
+
+        exitscr()
+
+    # Stops the dashboard and restores the terminal
+    def finish(self):
+        self.done.set()
+        self.join()
+
+    # Writes the current counters to the screen
+    def __Draw(self, stdscr, pkts, nbytes, pps, bps):
+        elapsed = datetime.now() - self.dt_start
+        remaining = max(self.dt_run - datetime.now(), timedelta(0))
+
+        lines = [
+            "+----------------------------------------------+",
+            "|              Base Capture Running            |",
+            "+----------------------------------------------+",
+            "Interface: " + self.iface,
+            "Elapsed:   " + str(elapsed).split('.')[0],
+            "Remaining: " + str(remaining).split('.')[0],
+            "",
+            "Packets:   " + str(pkts) + " (" + str(int(pps)) + " pkts/s)",
+            "Bytes:     " + str(nbytes) + " (" + str(round(bps / 1000000, 2)) + " Mbit/s)",
+            "",
+            "Top Talkers:",
+        ]
+        # Copies are taken as the sniffer keeps updating the counters
+        for addr, count in Counter(dict(self.talkers)).most_common(5):
+            lines.append("    " + addr.ljust(40) + str(count))
+        lines.append("")
+        lines.append("Top Protocols:")
+        for proto, count in Counter(dict(self.protocols)).most_common(5):
+            lines.append("    " + proto.ljust(40) + str(count))
+        if self.notices:
+            lines.append("")
+            lines += self.notices
+        lines.append("")
+        lines.append("^C to stop the scan.")
+
+        stdscr.erase()
+        height, width = stdscr.getmaxyx()
+        for row, line in enumerate(lines[:height - 1]):
+            stdscr.addstr(row, 0, line[:width - 1])
+        stdscr.refresh()
+
 class BaseCap:
     # Initialize functu=ion used to load the base settings, create the 
-    # capture files and start the capture
-    def __init__(self):
+    # capture files and start the capture. Settings can be passed in
+    # directly, then they are not loaded from or saved to the pickle file.
+    def __init__(self, settings=None):
         # Loads the pickle object for the base settings dictionary
         global basesettings
-        basesettings = self.load_obj('settings')
+        self.persist = settings is None
+        if settings is None:
+            basesettings = self.load_obj('settings')
+        else:
+            basesettings = settings
+
+        # Several interfaces can be listed, seperated by spaces. Each one is
+        # then captured by its own process into its own file.
+        interfaces = basesettings['Interface'].split()
+        self.multi = len(interfaces) > 1
+
+        # Packets are only written around a trigger when a pre-trigger
+        # ring is set
+        self.triggered = (basesettings.get('TriggerSecs', '') != '' or
+                          basesettings.get('TriggerSize', '') != '')
+
+        # A single interface can be shared by several capture workers
+        workers = self.__ConvertWorkers()
+        if self.multi and workers > 1:
+            print(colored("Capture workers are only used with a single interface.\n", 'yellow'))
+            workers = 1
+
+        # Names added to the file of each capture process
+        if self.multi:
+            suffixes = ['_' + iface for iface in interfaces]
+        elif workers > 1:
+            suffixes = ['_w' + str(num) for num in range(1, workers + 1)]
+        else:
+            suffixes = []
 
         # Creates the log files
         pathfile = (basesettings['BaseCapPath'] + '/' + basesettings['BaseFileName'])
 
         # Checks to see if file already exists. If it does, it adds a number
         # to the end of the file name.
-        if os.path.exists((pathfile + '.pcap')):
+        if self.__InUse(pathfile, suffixes):
             i = 1
-            while os.path.exists((pathfile + str(i) + '.pcap')):
+            while self.__InUse(pathfile + str(i), suffixes):
                 i += 1
             log_pcap = pathfile + str(i) + '.pcap'
         else:
             log_pcap = pathfile + '.pcap'
-        
-        # Creates the pcap file
-        f = open(log_pcap, "a")
-        f.close()
 
-        basesettings.update({'LogPCAP': log_pcap})
+        # Set to stop the capture before the run time is reached
+        self.stop_event = threading.Event()
+        self.dt_run = None
+        self.results = None
+        self.writer = None
+        self.report = None
+        self.health = None
+        self.health_file = None
+        self.fanout = None
+        self.sampler = None
+        self.cutoff = None
+        self.trigger = None
+        self.procs = []
+        self.name = interfaces[0]
+        self.prefix = ''
+
+        if self.multi:
+            self.__StartMulti(interfaces, log_pcap)
+            return
+
+        if workers > 1:
+            self.__StartFanout(interfaces[0], log_pcap, workers)
+            return
+
+        self.iface = interfaces[0]
+        self.__OpenWriter(log_pcap)
+
+        basesettings.update({'LogPCAP': self.writer.path})
         
-        self.save_obj(basesettings, 'settings')
+        self.__SaveSettings()
+
+        self.__StartCap()
+
+    # Creates the pcap file and keeps it open for the whole capture. With
+    # rotation enabled the capture is split into numbered segments. Every
+    # file gets a time index so the stats can jump to a time range.
+    def __OpenWriter(self, log_pcap):
+        global basesettings
+
+        max_size, max_time, keep = self.__ConvertRotation()
+        self.snaplen = self.__ConvertSnapLen()
+
+        # Sampled captures keep one in rate packets, the rate is saved with
+        # the capture so the stats can be scaled back up
+        mode, rate = self.__ConvertSampling()
+        self.sampler = Sampler(mode, rate) if mode is not None else None
+
+        # Flows past the cutoff are still counted but no longer written
+        max_bytes, max_pkts = self.__ConvertCutoff()
+        if max_bytes > 0 or max_pkts > 0:
+            self.cutoff = FlowCutoff(max_bytes, max_pkts)
+        else:
+            self.cutoff = None
+
+        self.writer = CapWriter(log_pcap, basesettings.get('FlushPolicy', DEFAULT_FLUSH),
+                                max_size=max_size, max_time=max_time, keep=keep,
+                                on_close=self.__SegmentClosed, snaplen=self.snaplen,
+                                compress=self.__Compression(), index=INDEX_PACKETS,
+                                meta=self.__CaptureMeta())
+
+        # A triggered capture keeps the packets in memory and only writes
+        # them out when the trigger fires
+        pre_secs, pre_bytes, post, rate = self.__ConvertTrigger()
+        if self.triggered:
+            self.sink = CapRing(self.writer, pre_secs, pre_bytes, post)
+        else:
+            self.sink = self.writer
+
+    # Works out when the scan ends from the Run Time or Run Period.
+    # Returns None for both if neither is set.
+    def __CalcStop(self):
+        global basesettings
+
+        if basesettings['RunTime'] != '':
+            return self.__CalcRuntime()
+        elif basesettings['RunPeriod'] != '':
+            return self.__CalcPeriod()
+        else:
+            return None, None
+
+    # Starts one capture process per interface, waits for them to finish
+    # and gathers their results. The per-interface captures can then be
+    # merged into a single timestamp ordered file.
+    def __StartMulti(self, interfaces, log_pcap):
+        stem = log_pcap[:-len('.pcap')]
+
+        jobs = [(iface, iface, stem + '_' + iface + '.pcap', None) for iface in interfaces]
+        finished = self.__RunWorkers(jobs)
+        if finished is None:
+            return
+
+        print(colored("\nScan has stopped!", 'green'))
+
+        for result in finished:
+            print(colored("\n[" + result['Interface'] + "]", 'yellow'))
+            if result['Captured'] is None:
+                print(colored("Capture process was terminated, counters unavailable", 'red'))
+                continue
+            print(colored("Packets captured: ", 'blue') + str(result['Captured']))
+            if result['Seen'] is not None:
+                print(colored("Packets seen before sampling: ", 'blue') + str(result['Seen']))
+            print(colored("Packets written: ", 'blue') + str(result['Written']))
+            if result['CutPkts'] is not None:
+                print(colored("Past the flow cutoff (not written): ", 'blue') + str(result['CutPkts']))
+            if result['Triggers'] is not None:
+                print(colored("Triggers fired: ", 'blue') + str(result['Triggers']))
+            print(colored("Writer queue overflows: ", 'blue') + str(result['Overflows']))
+            if result['KernelDrops'] is not None:
+                print(colored("Kernel drops: ", 'blue') + str(result['KernelDrops']))
+            if result['Health'] is not None:
+                print(colored("Capture health saved to ", 'green') + result['Health'])
+            if result['Report'] is not None:
+                print(colored("Stats outputted to ", 'green') + result['Report'])
+
+        self.__MergeResults(stem, finished)
+
+    # Captures one interface with several worker processes. Each worker
+    # opens its own socket in the same PACKET_FANOUT group, the kernel
+    # hands every flow to one of them by hash, and each one writes its own
+    # capture file. Their counters are added up for the summary.
+    def __StartFanout(self, iface, log_pcap, workers):
+        global basesettings
+
+        stem = log_pcap[:-len('.pcap')]
+
+        # The stats of one worker only cover its share of the flows, they
+        # are collected from the capture files afterwards instead
+        if basesettings.get('LiveStats', 'Yes') == 'Yes':
+            print(colored("Live stats are not available with several capture workers, "
+                          "run the stats after the scan.\n", 'yellow'))
+            basesettings['LiveStats'] = 'No'
+
+        self.fanout = os.getpid() & 0xffff
+        cores = os.cpu_count() or 1
+        jobs = [('w' + str(num), iface, stem + '_w' + str(num) + '.pcap', (num - 1) % cores)
+                for num in range(1, workers + 1)]
+        finished = self.__RunWorkers(jobs)
+        if finished is None:
+            return
+
+        print(colored("\nScan has stopped!", 'green'))
+
+        for result in finished:
+            if result['Captured'] is None:
+                print(self.__Prefix(result['Name']) + "terminated, counters unavailable")
+            else:
+                print(self.__Prefix(result['Name']) + "captured " + str(result['Captured']) +
+                      ", written " + str(result['Written']))
+
+        # Terminated workers have no counters and are left out of the totals
+        counted = [result for result in finished if result['Captured'] is not None]
+        drops = [result['KernelDrops'] for result in counted if result['KernelDrops'] is not None]
+        overflows = sum(result['Overflows'] for result in counted)
+
+        print(colored("\nCapture workers: ", 'blue') + str(len(finished)))
+        print(colored("Packets captured: ", 'blue') + str(sum(result['Captured'] for result in counted)))
+        if counted and counted[0]['Seen'] is not None:
+            print(colored("Packets seen before sampling: ", 'blue') +
+                  str(sum(result['Seen'] for result in counted)))
+        print(colored("Packets written: ", 'blue') + str(sum(result['Written'] for result in counted)))
+        if counted and counted[0]['Triggers'] is not None:
+            print(colored("Triggers fired: ", 'blue') +
+                  str(max(result['Triggers'] for result in counted)))
+        if counted and counted[0]['CutPkts'] is not None:
+            print(colored("Past the flow cutoff (not written): ", 'blue') +
+                  str(sum(result['CutPkts'] for result in counted)))
+        if overflows > 0:
+            print(colored("Writer queue overflows (packets lost): ", 'red') + str(overflows))
+        else:
+            print(colored("Writer queue overflows: ", 'blue') + "0")
+        if not drops:
+            print(colored("Kernel drops: ", 'blue') + "unavailable")
+        elif sum(drops) > 0:
+            print(colored("Kernel drops (packets lost): ", 'red') + str(sum(drops)))
+        else:
+            print(colored("Kernel drops: ", 'blue') + "0")
+        for result in finished:
+            if result['Health'] is not None:
+                print(colored("Capture health saved to ", 'green') + result['Health'])
+
+        self.__MergeResults(stem, finished)
+
+    # Forks a capture process for each job of (name, interface, capture
+    # file, cpu), waits for the scan to end and returns their results in
+    # job order. Returns None when no run time is set.
+    def __RunWorkers(self, jobs):
+        global basesettings
+
+        # All processes share the same stop time
+        self.dt_now, self.dt_run = self.__CalcStop()
+        if self.dt_run is None:
+            return None
+
+        # One curses screen can't be shared by several processes
+        if basesettings.get('DisplayMode', 'Lines') == 'Dashboard':
+            print(colored("Dashboard is not available with several capture processes, "
+                          "displaying packet lines.\n", 'yellow'))
+            basesettings['DisplayMode'] = 'Lines'
+
+        # Forked so the workers inherit the loaded settings and this object
+        ctx = multiprocessing.get_context('fork')
+        results = ctx.Queue()
+        stop = ctx.Event()
+        procs = []
+        for name, iface, log_pcap, cpu in jobs:
+            proc = ctx.Process(target=self.__IfaceWorker, name=name,
+                               args=(name, iface, log_pcap, cpu, results, stop))
+            proc.start()
+            procs.append(proc)
+        self.procs = procs
+
+        self.__WaitUntil(self.dt_run)
+
+        # Passes an early stop on to the capture processes. They close their
+        # captures and send their results before exiting.
+        if self.stop_event.is_set():
+            stop.set()
+
+        # Results are read while waiting so a full pipe can't block a worker.
+        # A worker sends its capture files once its capture is closed and its
+        # report and health files once they are written. Only the capture
+        # has to close within WORKER_STOP seconds of the stop, a worker that
+        # is still writing its report is waited for.
+        captures = {}
+        deadline = time.monotonic() + WORKER_STOP
+        while any(proc.is_alive() for proc in procs):
+            self.__ReadResult(results, captures, 0.5)
+            if time.monotonic() <= deadline:
+                continue
+            for proc in procs:
+                if proc.name not in captures and proc.is_alive():
+                    print(colored("[*] Error: Capture process " + proc.name +
+                                  " did not stop, terminating it.", 'red'))
+                    proc.terminate()
+            deadline = float('inf')
+        for proc in procs:
+            proc.join()
+        while self.__ReadResult(results, captures, 0):
+            pass
+
+        # What a terminated worker wrote is still listed
+        finished = []
+        for name, iface, log_pcap, cpu in jobs:
+            if name not in captures:
+                captures[name] = self.__LeftResult(name, iface, log_pcap)
+            finished.append(captures[name])
+
+        return finished
+
+    # Reads one worker message into the results by worker name. Returns
+    # False when none came within the timeout.
+    def __ReadResult(self, results, captures, timeout):
+        try:
+            result = results.get(timeout=timeout) if timeout > 0 else results.get_nowait()
+        except queue.Empty:
+            return False
+        if result['Name'] in captures:
+            captures[result['Name']].update(result)
+        else:
+            captures[result['Name']] = result
+        return True
+
+    # Result of a worker that was terminated before sending its capture,
+    # its counters are unknown but the files it left are listed
+    def __LeftResult(self, name, iface, log_pcap):
+        stem = log_pcap[:-len('.pcap')]
+        segments = [log_pcap + ext for ext in COMPRESS_EXT.values() if os.path.isfile(log_pcap + ext)]
+        segments += sorted(glob.glob(glob.escape(stem) + '_[0-9][0-9][0-9][0-9].pcap*'))
+
+        return {
+            'Name':         name,
+            'Interface':    iface,
+            'Captured':     None,
+            'Written':      None,
+            'Overflows':    None,
+            'Segments':     segments,
+            'Report':       None,
+            'KernelDrops':  None,
+            'Seen':         None,
+            'CutPkts':      None,
+            'Triggers':     None,
+            'Health':       None,
+            'Done':         False
+        }
+
+    # Optionally merges the captures of the worker processes into one file,
+    # by timestamp, and saves where the captures and reports are
+    def __MergeResults(self, stem, finished):
+        global basesettings
+
+        segments = []
+        reports = []
+        for result in finished:
+            segments += result['Segments']
+            if result['Report'] is not None:
+                reports.append(result['Report'])
+
+        merged = None
+        if basesettings.get('MergeOutput', 'No') == 'Yes':
+            compress = self.__Compression()
+            merged = stem + '_merged.pcap'
+            count = merge_pcaps([result['Segments'] for result in finished], merged, compress,
+                                INDEX_PACKETS, self.__CaptureMeta())
+            merged += COMPRESS_EXT[compress]
+            if count is None:
+                print(colored("\nCaptures have different link types, not merged.", 'red'))
+                merged = None
+            else:
+                print(colored("\nMerged " + str(count) + " packets into " + merged, 'green'))
+                segments.append(merged)
+
+        if merged is not None:
+            basesettings.update({'LogPCAP': merged})
+        elif segments:
+            basesettings.update({'LogPCAP': segments[0]})
+        basesettings.update({'Segments': segments})
+        basesettings.update({'StatsReports': reports})
+        self.__SaveSettings()
+
+    # Runs in each capture process of a multi-interface or multi-worker
+    # scan. Workers are pinned to their own core when given one. The parent
+    # stops them by setting stop. A ^C or hangup of the terminal reaches
+    # every process, it is ignored once the worker is closing its capture.
+    def __IfaceWorker(self, name, iface, log_pcap, cpu, results, stop):
+        self.name = name
+        self.iface = iface
+        self.results = results
+        self.capture_sent = False
+        self.prefix = self.__Prefix(name)
+        self.stop_event = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_IGN)
+        threading.Thread(target=self.__WaitStop, args=(stop,), name='stop', daemon=True).start()
+        if cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {cpu})
+        self.__OpenWriter(log_pcap)
 
         self.__StartCap()
+
+    # Passes the stop of the parent process on to the capture of a worker
+    def __WaitStop(self, stop):
+        stop.wait()
+        self.stop_event.set()
+
+    # Builds the tag shown in front of the lines of one capture process
+    def __Prefix(self, name):
+        return colored("[" + name + "] ", 'cyan')
         
     # The startup function of the base capture.
     def __StartCap(self):
@@ -60,36 +1009,308 @@ class BaseCap:
         global pkt_count
         pkt_count = 1
         
-        # Determine if user specified a run time or a run period
-        if basesettings['RunTime'] != '':
-            # After calculating how long the program is specified to run for
-            # the program starts an asynchronous sniffer that captures packets
-            # in a seperate thread.
-            dt_now, dt_run = self.__CalcRuntime()
-            
-            Asniff = AsyncSniffer(iface=basesettings['Interface'], prn=self.__DisplayPackets)
-            Asniff.start()
-            
-            while dt_now <= dt_run:
-                dt_now, str_now, date_now = self.__GetTimeNow()
-
-            Asniff.stop()
-            print(colored("\nScan has stopped!", 'green'))
-        
-        elif basesettings['RunPeriod'] != '':
-            # After calculating how long the program is specified to run for
-            # the program starts an asynchronous sniffer that captures packets
-            # in a seperate thread.
-            dt_now, dt_run = self.__CalcPeriod()
-
-            Asniff = AsyncSniffer(iface=basesettings['Interface'], prn=self.__DisplayPackets)
-            Asniff.start()
-            
-            while dt_now <= dt_run:
-                dt_now, str_now, date_now = self.__GetTimeNow()
-
-            Asniff.stop()
+        # Determine if user specified a run time or a run period. Capture
+        # processes of a multi-interface scan are given their stop time.
+        if self.dt_run is not None:
+            dt_now, dt_run = self.dt_now, self.dt_run
+        else:
+            dt_now, dt_run = self.__CalcStop()
+
+        if dt_run is None:
+            self.writer.close()
+            self.__SaveSegments()
+            return
+
+        # Validates the capture filter before it is attached to the socket
+        cap_filter = basesettings.get('CapFilter', '')
+        if cap_filter != '':
+            valid, program = check_filter(self.iface, cap_filter)
+            if valid == False:
+                print(colored("[*] Error: Invalid capture filter: " + cap_filter, 'red'))
+                for line in program:
+                    print(line)
+                self.writer.close()
+                self.__SaveSegments()
+                return
+
+            print(self.prefix + colored("Capture filter: " + cap_filter + " (" + str(len(program)) +
+                                        " BPF instructions attached in kernel)\n", 'green'))
+        else:
+            cap_filter = None
+
+        # The socket is opened here so its kernel drop counters can be read,
+        # and so the workers of a fanout group can join it
+        sock = self.__OpenSocket(cap_filter)
+        if self.fanout is not None and not join_fanout(sock, self.fanout):
+            print(colored("[*] Error: Could not join the fanout group of " + self.iface, 'red'))
+            sock.close()
+            self.writer.close()
+            self.__SaveSegments()
+            return
+
+        # The sniffer thread only queues packets. Writing them to the pcap
+        # and displaying them is done by their own consumer threads, so a
+        # slow terminal can no longer hold back the capture.
+        self.disp_rate = int(basesettings.get('DisplayRate', DISPLAY_RATE))
+        self.disp_second = time.monotonic()
+        self.disp_lines = 0
+        self.disp_hidden = 0
+
+        # The ring sniffer writes the capture itself
+        self.write_queue = None
+        if self.capture_mode != 'Ring':
+            self.write_queue = PktConsumer('writer', self.__LogPackets,
+                                           int(basesettings.get('WriteQueue', WRITE_QUEUE)))
+            self.write_queue.start()
+
+        # Keeps the stats report up to date while capturing, so it is ready
+        # when the scan stops. Dissection for the stats happens on this
+        # consumer thread, not in the sniffer.
+        self.stats = None
+        self.stats_queue = None
+        self.report = None
+        if basesettings.get('LiveStats', 'Yes') == 'Yes':
+            # Only loaded when needed, pcapstats pulls in the plotting modules
+            import pcapstats
+            self.stats = pcapstats.LiveStats(self.sampler.rate if self.sampler is not None else 1)
+            self.stats_queue = PktConsumer('stats', self.__StatsPackets,
+                                           int(basesettings.get('StatsQueue', STATS_QUEUE)))
+            self.stats_queue.start()
+
+        # The dashboard mode replaces the packet lines with a live summary,
+        # nothing is shown during the scan in the None mode
+        self.dashboard = None
+        self.display_queue = None
+        display_mode = basesettings.get('DisplayMode', 'Lines')
+        if display_mode == 'Dashboard':
+            self.dashboard = CapDashboard(self.iface, dt_now, dt_run)
+            self.dashboard.start()
+        elif display_mode != 'None':
+            self.display_queue = PktConsumer('display', self.__DisplayPackets,
+                                             int(basesettings.get('DisplayQueue', DISPLAY_QUEUE)),
+                                             idle=self.__DisplayHidden)
+            self.display_queue.start()
+
+        # After calculating how long the program is specified to run for
+        # the program starts an asynchronous sniffer that captures packets
+        # in a seperate thread, then sleeps until the run time is reached.
+        # The raw capture mode keeps frames as bytes and only dissects the
+        # ones a consumer actually looks at. The ring mode writes frames
+        # to the capture straight out of the memory-mapped ring.
+        self.health = CapHealth(self.iface, sock)
+        if self.capture_mode == 'Ring':
+            shared = self.stats_queue is not None or self.dashboard is not None or \
+                self.display_queue is not None
+            Asniff = RingSniffer(sock, self.sink, self.__SharePackets if shared else None,
+                                 self.snaplen, self.sampler, self.cutoff)
+        elif self.capture_mode == 'Raw':
+            Asniff = RawSniffer(sock, self.__QueuePackets, self.snaplen)
+        else:
+            Asniff = AsyncSniffer(opened_socket=sock, prn=self.__QueuePackets, store=False)
+        Asniff.start()
+
+        if self.triggered:
+            pre_secs, pre_bytes, post, rate = self.__ConvertTrigger()
+            trigger_filter = basesettings.get('TriggerFilter', '') or None
+            self.trigger = CapTrigger(self.iface, self.sink, trigger_filter, rate,
+                                      self.__PacketCount, self.__Notice)
+            self.trigger.start()
+            self.__Notice("Keeping packets in memory until triggered "
+                          "(kill -USR1 " + str(os.getpid()) + ").")
+
+        self.__WaitUntil(dt_run)
+
+        Asniff.stop()
+        if self.trigger is not None:
+            self.trigger.stop()
+        self.health.finish()
+        sock.close()
+        if self.write_queue is not None:
+            self.write_queue.finish()
+        # The screen is given back before the last segment is closed, so
+        # it can be printed
+        if self.dashboard is not None:
+            self.dashboard.finish()
+            self.dashboard = None
+        self.writer.close()
+        if self.display_queue is not None:
+            self.display_queue.finish()
+
+        # The parent of a capture process gets the capture files now, the
+        # stats report may take a while
+        if self.results is not None:
+            self.__SendCapture()
+
+        if self.stats_queue is not None:
+            self.stats_queue.finish()
+            self.__WriteReport()
+
+        self.__WriteHealth()
+
+        if self.results is None:
             print(colored("\nScan has stopped!", 'green'))
+            self.__ScanSummary()
+        self.__SaveSegments()
+
+    # Opens the capture socket for the capture mode. The ring mode falls
+    # back to the raw mode when the kernel won't give it a ring. The packets
+    # the host sends are left out when the Outgoing setting is No.
+    def __OpenSocket(self, cap_filter):
+        global basesettings
+
+        self.capture_mode = basesettings.get('CaptureMode', 'Dissect')
+        outgoing = basesettings.get('Outgoing', 'Yes') == 'Yes'
+        load_scapy(self.capture_mode == 'Dissect')
+        if self.capture_mode == 'Ring':
+            try:
+                ring = PacketRing(self.iface, outgoing=outgoing)
+            except OSError as err:
+                print(colored("Packet ring not available (" + str(err) + "), "
+                              "capturing in Raw mode.\n", 'yellow'))
+                self.capture_mode = 'Raw'
+            else:
+                if cap_filter is not None:
+                    from scapy.arch.linux import attach_filter
+                    attach_filter(ring.ins, cap_filter, self.iface)
+                return ring
+
+        sock = conf.L2listen(iface=self.iface, filter=cap_filter)
+        if not outgoing and not ignore_outgoing(sock):
+            print(colored("Can't leave out the packets this host sends on " + self.iface +
+                          ", capturing them too.\n", 'yellow'))
+        return sock
+
+    # Writes the live stats report next to the capture, the same way
+    # netreader saves the output of pcapstats.
+    def __WriteReport(self):
+        import pcapstats
+
+        self.report = self.writer.stem + '.txt'
+        path = pcapstats.stats_dir(self.writer.stem + '.pcap')
+
+        with open(self.report, 'w') as out:
+            with contextlib.redirect_stdout(out):
+                if self.stats_queue.overflows > 0:
+                    print("Note: " + str(self.stats_queue.overflows) +
+                          " packets were captured but not included in these stats.")
+                self.stats.report(path)
+
+        os.system("sudo chmod -R a+rw " + path)
+
+    # Saves the capture health next to the capture
+    def __WriteHealth(self):
+        global pkt_count
+
+        consumers = []
+        if self.write_queue is not None:
+            consumers.append(self.write_queue)
+        if self.display_queue is not None:
+            consumers.append(self.display_queue)
+        if self.stats_queue is not None:
+            consumers.append(self.stats_queue)
+
+        self.health_file = self.writer.stem + '.health.json'
+        self.health.save(self.health_file, pkt_count - 1, self.writer, consumers)
+
+    # Prints how many packets were captured, written and dropped by the
+    # kernel, the interface and the writer and display queues.
+    def __ScanSummary(self):
+        global pkt_count
+
+        print(colored("Packets captured: ", 'blue') + str(pkt_count - 1))
+        if self.sampler is not None:
+            print(colored("Sampling: ", 'blue') + self.sampler.mode + " 1 in " +
+                  str(self.sampler.rate) + ", kept " + str(self.sampler.kept) + " of " +
+                  str(self.sampler.seen) + " packets")
+        print(colored("Packets written: ", 'blue') + str(self.writer.pkts_written))
+        if self.trigger is not None:
+            print(colored("Triggers fired: ", 'blue') + str(self.sink.triggers) + ", " +
+                  str(self.sink.dumped) + " packets saved from memory")
+        if self.cutoff is not None:
+            print(colored("Past the flow cutoff (not written): ", 'blue') +
+                  str(self.cutoff.cut_pkts) + " packets, " + str(self.cutoff.cut_bytes) + " bytes")
+        # There is no writer queue in the ring mode
+        if self.write_queue is not None:
+            if self.write_queue.overflows > 0:
+                print(colored("Writer queue overflows (packets lost): ", 'red') +
+                      str(self.write_queue.overflows))
+            else:
+                print(colored("Writer queue overflows: ", 'blue') + "0")
+        self.__HealthSummary(self.health)
+        if self.display_queue is not None:
+            print(colored("Display queue overflows (not displayed): ", 'blue') +
+                  str(self.display_queue.overflows))
+        if self.stats_queue is not None:
+            print(colored("Stats queue overflows (not in report): ", 'blue') +
+                  str(self.stats_queue.overflows))
+            print(colored("Stats outputted to ", 'green') + self.report)
+        print(colored("Capture health saved to ", 'green') + self.health_file)
+
+    # Prints the kernel and interface drops and the writer latency
+    def __HealthSummary(self, health):
+        if health.kernel_drops is None:
+            print(colored("Kernel drops: ", 'blue') + "unavailable")
+        elif health.kernel_drops > 0:
+            print(colored("Kernel drops (packets lost): ", 'red') + str(health.kernel_drops) +
+                  " of " + str(health.kernel_pkts))
+        else:
+            print(colored("Kernel drops: ", 'blue') + "0")
+
+        dropped = health.iface_delta.get('rx_dropped', 0) + health.iface_delta.get('rx_missed_errors', 0)
+        if dropped > 0:
+            print(colored("Interface drops: ", 'red') + str(dropped))
+
+        if self.write_queue is not None:
+            print(colored("Writer queue high-water mark: ", 'blue') +
+                  str(self.write_queue.high_water) + "/" + str(self.write_queue.maxsize))
+        print(colored("Slowest write to disk: ", 'blue') +
+              str(round(self.writer.latency_max / 1000, 2)) + " ms")
+
+    # Sleeps until dt_run is reached or a stop signal (^C, kill, hangup) is
+    # recieved, leaving the CPU to the sniffer thread. Wakes up once every
+    # flush interval so buffered packets still reach the disk on a quiet link.
+    def __WaitUntil(self, dt_run):
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+                handlers[sig] = signal.signal(sig, self.__StopSignal)
+            if self.triggered:
+                handlers[signal.SIGUSR1] = signal.signal(signal.SIGUSR1, self.__TriggerSignal)
+
+        try:
+            while not self.stop_event.is_set():
+                remaining = (dt_run - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                if self.writer is not None:
+                    poll = self.writer.max_secs if self.writer.max_secs > 0 else WRITER_POLL
+                    self.stop_event.wait(min(remaining, poll))
+                    self.writer.poll()
+                    if self.health is not None:
+                        self.health.poll()
+                else:
+                    self.stop_event.wait(remaining)
+        finally:
+            for sig in handlers:
+                signal.signal(sig, handlers[sig])
+
+    # Signal handler used to end the capture early
+    def __StopSignal(self, signum, frame):
+        self.stop_event.set()
+
+    # Signal handler used to fire the trigger of a triggered capture. The
+    # signal is passed on to the capture processes of a multi-process scan.
+    def __TriggerSignal(self, signum, frame):
+        if self.trigger is not None:
+            self.trigger.event.set()
+        for proc in self.procs:
+            if proc.is_alive():
+                os.kill(proc.pid, signal.SIGUSR1)
+
+    # Gets the number of packets captured so far
+    def __PacketCount(self):
+        global pkt_count
+        return pkt_count - 1
 
     # From the given Run Time, it calculates how long the program will run.
     # Run Time is used to specify a time of day that the program will run
@@ -150,6 +1371,186 @@ class BaseCap:
         
         return days, hours, minutes
 
+    # Converts the RotateSize (MB), RotateTime (minutes) and RotateKeep
+    # settings into bytes, seconds and a segment count. Unset values are 0.
+    def __ConvertRotation(self):
+        global basesettings
+
+        size = basesettings.get('RotateSize', '')
+        minutes = basesettings.get('RotateTime', '')
+        keep = basesettings.get('RotateKeep', '')
+
+        max_size = int(size) * 1024 * 1024 if size != '' else 0
+        max_time = int(minutes) * 60 if minutes != '' else 0
+        keep = int(keep) if keep != '' else 0
+
+        return max_size, max_time, keep
+
+    # Converts the SnapLen setting into the number of bytes kept of each
+    # frame. Unset keeps full frames (0).
+    def __ConvertSnapLen(self):
+        global basesettings
+
+        snaplen = basesettings.get('SnapLen', '')
+        return int(snaplen) if snaplen != '' else 0
+
+    # Converts the TriggerSecs, TriggerSize (MB), TriggerPost (seconds) and
+    # TriggerRate (packets per second) settings of a triggered capture.
+    # Unset values are 0, except the time saved after a trigger.
+    def __ConvertTrigger(self):
+        global basesettings
+
+        secs = basesettings.get('TriggerSecs', '')
+        size = basesettings.get('TriggerSize', '')
+        post = basesettings.get('TriggerPost', '')
+        rate = basesettings.get('TriggerRate', '')
+
+        pre_secs = int(secs) if secs != '' else 0
+        pre_bytes = int(size) * 1024 * 1024 if size != '' else 0
+        post = int(post) if post != '' else TRIGGER_POST
+        rate = int(rate) if rate != '' else 0
+
+        return pre_secs, pre_bytes, post, rate
+
+    # Converts the SampleMode and SampleRate settings into the sampling mode
+    # and its rate. Both are None when every packet is kept.
+    def __ConvertSampling(self):
+        global basesettings
+
+        mode = basesettings.get('SampleMode', 'None')
+        rate = basesettings.get('SampleRate', '')
+        if mode == 'None' or rate == '' or int(rate) <= 1:
+            return None, None
+
+        return mode, int(rate)
+
+    # Converts the CutoffSize (KB) and CutoffPackets settings into the bytes
+    # and packets recorded of each flow. Unset values are 0.
+    def __ConvertCutoff(self):
+        global basesettings
+
+        size = basesettings.get('CutoffSize', '')
+        pkts = basesettings.get('CutoffPackets', '')
+
+        max_bytes = int(size) * 1024 if size != '' else 0
+        max_pkts = int(pkts) if pkts != '' else 0
+
+        return max_bytes, max_pkts
+
+    # Builds the metadata saved next to each capture file
+    def __CaptureMeta(self):
+        global basesettings
+
+        mode, rate = self.__ConvertSampling()
+        max_bytes, max_pkts = self.__ConvertCutoff()
+        return {
+            'interface':    basesettings['Interface'],
+            'capture_mode': basesettings.get('CaptureMode', 'Dissect'),
+            'snaplen':      self.__ConvertSnapLen(),
+            'filter':       basesettings.get('CapFilter', ''),
+            'sample_mode':  mode or 'None',
+            'sample_rate':  rate or 1,
+            'cutoff_bytes': max_bytes,
+            'cutoff_pkts':  max_pkts
+        }
+
+    # Converts the Workers setting into the number of capture processes.
+    # Unset captures with the one process.
+    def __ConvertWorkers(self):
+        global basesettings
+
+        workers = basesettings.get('Workers', '')
+        return max(int(workers), 1) if workers != '' else 1
+
+    # Gets the Compression setting. zstd falls back to gzip when the
+    # zstandard module is not installed.
+    def __Compression(self):
+        global basesettings
+
+        compress = basesettings.get('Compression', '')
+        if compress == 'zstd' and zstandard is None:
+            print(colored("zstandard is not installed, compressing with gzip.", 'yellow'))
+            compress = 'gzip'
+
+        return compress
+
+    # Determines if a capture file or its first segment already exists,
+    # including the files of each capture process of a multi-interface or
+    # multi-worker scan
+    def __InUse(self, pathfile, suffixes):
+        names = [pathfile] + [pathfile + suffix for suffix in suffixes]
+
+        for name in names:
+            for ext in COMPRESS_EXT.values():
+                if os.path.exists(name + '.pcap' + ext) or os.path.exists(segment_path(name, 1, ext)):
+                    return True
+        return False
+
+    # Called by the writer each time a segment of the capture is closed
+    def __SegmentClosed(self, path):
+        self.__Notice("Segment saved: " + path)
+
+    # Shows a message about the capture. The dashboard shows it instead
+    # while it is on screen, a curses screen can't be printed over.
+    def __Notice(self, message):
+        if getattr(self, 'dashboard', None) is not None:
+            self.dashboard.notice(message)
+        else:
+            print(self.prefix + colored(message, 'green'))
+
+    # Stores the list of capture files left on disk in the base settings,
+    # so they can be picked up by the stats. The capture process of one
+    # interface sends them back to the parent process instead.
+    def __SaveSegments(self):
+        global basesettings
+
+        if self.results is not None:
+            if not self.capture_sent:
+                self.__SendCapture()
+            self.results.put({
+                'Name':         self.name,
+                'Report':       self.report,
+                'Health':       self.health_file,
+                'Done':         True
+            })
+            return
+
+        basesettings.update({'Segments': self.__Segments()})
+        if self.report is not None:
+            basesettings.update({'StatsReports': [self.report]})
+        else:
+            basesettings.update({'StatsReports': []})
+        self.__SaveSettings()
+
+    # Capture files of the scan
+    def __Segments(self):
+        if self.writer.rotating:
+            return list(self.writer.segments)
+        return [self.writer.path]
+
+    # Sends the capture files and counters of a capture process to the
+    # parent, as soon as the capture is closed. Its report and health files
+    # follow once they are written (see __SaveSegments()).
+    def __SendCapture(self):
+        global pkt_count
+
+        self.capture_sent = True
+        self.results.put({
+            'Name':         self.name,
+            'Interface':    self.iface,
+            'Captured':     pkt_count - 1,
+            'Written':      self.writer.pkts_written,
+            'Overflows':    self.write_queue.overflows if getattr(self, 'write_queue', None) is not None else 0,
+            'Segments':     self.__Segments(),
+            'Report':       None,
+            'KernelDrops':  self.health.kernel_drops if self.health is not None else None,
+            'Seen':         self.sampler.seen if self.sampler is not None else None,
+            'CutPkts':      self.cutoff.cut_pkts if self.cutoff is not None else None,
+            'Triggers':     self.sink.triggers if self.trigger is not None else None,
+            'Health':       None,
+            'Done':         False
+        })
+
     # Gets the time now for runtime calculations
     def __GetTimeNow(self):
         now = datetime.now()
@@ -158,25 +1559,110 @@ class BaseCap:
 
         return now, current_time, current_day
 
-    # Displays a summary of the packets onto command-line
-    def __DisplayPackets(self, Packet):
+    # Sniffer callback. Only numbers the packet and hands it to the writer
+    # and display queues. Packets left out by the sampler go no further.
+    def __QueuePackets(self, Packet):
+        if self.sampler is not None and not self.__Sampled(Packet):
+            return
+
+        if self.cutoff is None or self.cutoff.keep(self.__FrameBytes(Packet), self.__WireLen(Packet)):
+            self.write_queue.offer(Packet)
+        self.__SharePackets(Packet)
+
+    # Asks the sampler whether to keep a packet. Only the Flow mode looks at
+    # the frame.
+    def __Sampled(self, Packet):
+        if self.sampler.mode != 'Flow':
+            return self.sampler.keep()
+
+        return self.sampler.keep(self.__FrameBytes(Packet))
+
+    # Gets the frame of a packet as it was captured
+    def __FrameBytes(self, Packet):
+        if isinstance(Packet, RawFrame):
+            return Packet.raw
+        return getattr(Packet, 'original', None) or bytes(Packet)
+
+    # Gets the size of a packet on the wire
+    def __WireLen(self, Packet):
+        if isinstance(Packet, RawFrame):
+            return Packet.wirelen
+        return getattr(Packet, 'wirelen', None) or len(Packet)
+
+    # Hands a packet to the stats and display queues, or the dashboard.
+    # Called directly by the ring sniffer, which writes the capture itself.
+    def __SharePackets(self, Packet):
         global pkt_count
-        timestamp = self.__GetTime()
-        pkts = Packet
 
-        self.__LogPackets(pkts)
+        if self.stats_queue is not None:
+            self.stats_queue.offer(Packet)
+        if self.dashboard is not None:
+            self.dashboard.count(Packet)
+        elif self.display_queue is not None:
+            self.display_queue.offer((pkt_count, Packet))
+
+        pkt_count += 1
+
+    # Displays a summary of the packets onto command-line. Once more than
+    # DisplayRate lines were printed in the current second, or the display
+    # queue is backing up, packets are only counted and reported as one
+    # aggregated line per second.
+    def __DisplayPackets(self, item):
+        num, Packet = item
+
+        now = time.monotonic()
+        if now - self.disp_second >= 1:
+            self.__DisplayHidden()
+            self.disp_second = now
+            self.disp_lines = 0
+
+        if (self.disp_lines >= self.disp_rate or
+                self.display_queue.queue.qsize() > self.display_queue.maxsize / 2):
+            self.disp_hidden += 1
+            return
+
+        if isinstance(Packet, RawFrame):
+            Packet = Packet.decoded()
 
-        pktsum = (colored((str(pkt_count) + ") "), 'yellow')) + (colored(str(timestamp), 'blue')) + Packet.summary()
+        timestamp = self.__GetTime(Packet.time)
+        pktsum = self.prefix + (colored((str(num) + ") "), 'yellow')) + (colored(str(timestamp), 'blue')) + Packet.summary()
         print(pktsum)
 
-        pkt_count += 1
+        self.disp_lines += 1
+
+    # Adds a packet to the live stats, raw frames are added undissected
+    def __StatsPackets(self, Packet):
+        if isinstance(Packet, RawFrame):
+            self.stats.add_frame(Packet.raw, Packet.time, Packet.cls)
+        else:
+            self.stats.add(Packet)
+
+    # Prints the number of packets left out of the display since last time
+    def __DisplayHidden(self):
+        if self.disp_hidden > 0:
+            print(colored("... " + str(self.disp_hidden) + " packets not displayed ...", 'yellow'))
+            self.disp_hidden = 0
 
-    # Logs the captured packets into a pcap file
+    # Logs the captured packets into the pcap file through the buffered writer,
+    # or into the pre-trigger ring of a triggered capture
     def __LogPackets(self, pkts):
+        if isinstance(pkts, RawFrame):
+            cls, raw, wirelen = pkts.cls, pkts.raw, pkts.wirelen
+        else:
+            cls, raw, wirelen = pkts.__class__, bytes(pkts), getattr(pkts, 'wirelen', None)
+
+        if self.writer.linktype is None:
+            self.writer.linktype = conf.l2types.layer2num.get(cls, DLT_EN10MB)
+
+        self.sink.write(raw, pkts.time, wirelen)
+
+    # Saves the base settings, with the capture results, unless they were
+    # passed in
+    def __SaveSettings(self):
         global basesettings
 
-        log_pcap = (basesettings['BaseCapPath'] + '/' + basesettings['BaseFileName'] + '.pcap')
-        wrpcap(log_pcap, pkts, append=True)
+        if self.persist:
+            self.save_obj(basesettings, 'settings')
 
     # Used to load pickle files, such as the basesettings
     def load_obj(self, name):
@@ -189,8 +1675,8 @@ class BaseCap:
             pickle.dump(obj, f)
 
     # Gets a parsed timestamp of the recieved packets
-    def __GetTime(self):
-        dt = datetime.now()
+    def __GetTime(self, timestamp):
+        dt = datetime.fromtimestamp(float(timestamp))
         time = dt.strftime("%Y-%m-%d (%H:%M:%S:%f) ")
         return time
     
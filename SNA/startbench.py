@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+#---------------------------------[Imports]------------------------------------
+# Times how long the capture and stats modules take to start, each in a
+# fresh interpreter, and fails when one is over its budget or loads a module
+# it should only load on first use:
+#
+#   python3 startbench.py [runs]
+
+# Internal modules
+import os
+import subprocess
+import sys
+
+# Downloaded modules
+from termcolor import colored
+
+#---------------------------------[Globals]------------------------------------
+# Seconds each startup may take (best of the runs), the code timed, and the
+# modules it must not have loaded yet
+BENCHMARKS = [
+    ('import scapyreader', 0.3,
+     "import scapyreader",
+     ('scapy', 'pcapstats', 'pandas', 'matplotlib')),
+    ('import pcapstats', 0.3,
+     "import pcapstats",
+     ('scapy', 'pandas', 'matplotlib', 'seaborn')),
+    ('import netreader', 0.3,
+     "import netreader",
+     ('scapy', 'pcapstats', 'pandas', 'matplotlib')),
+    ('raw capture ready', 0.8,
+     "import scapyreader; scapyreader.load_scapy()",
+     ('scapy.layers.all', 'pandas', 'matplotlib')),
+]
+
+RUNS = 5
+
+# Run in the child interpreter, prints the seconds taken and the modules
+# loaded that it was told to look for
+CHILD = """
+import sys, time
+start = time.perf_counter()
+{code}
+took = time.perf_counter() - start
+print(took)
+print(' '.join(name for name in {avoid!r} if name in sys.modules))
+"""
+
+#--------------------------------[Functions]-----------------------------------
+# Runs code in a fresh interpreter. Returns the seconds it took and the
+# avoided modules it loaded.
+def time_startup(code, avoid):
+    result = subprocess.run([sys.executable, '-c', CHILD.format(code=code, avoid=avoid)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode().strip())
+
+    took, loaded = result.stdout.decode().split('\n')[:2]
+    return float(took), loaded.split()
+
+#----------------------------------[Main]--------------------------------------
+def __Main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+
+    failed = 0
+    for name, budget, code, avoid in BENCHMARKS:
+        times = []
+        loaded = []
+        for i in range(runs):
+            took, loaded = time_startup(code, avoid)
+            times.append(took)
+
+        best = min(times)
+        line = "{:<20} {:>7.3f}s (budget {:.3f}s)".format(name, best, budget)
+        if best > budget or loaded:
+            failed += 1
+            if loaded:
+                line += " loaded " + ", ".join(loaded)
+            print(colored(line, 'red'))
+        else:
+            print(colored(line, 'green'))
+
+    sys.exit(1 if failed else 0)
+
+#-----------------------------------[Run]--------------------------------------
+if __name__ == '__main__':
+    __Main()
+#------------------------------------------------------------------------------
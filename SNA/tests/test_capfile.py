@@ -0,0 +1,190 @@
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import os
+
+# Downloaded modules
+import pytest
+
+# File imports
+import capfile
+from capfile import CapReader, CapRing, CapWriter, merge_pcaps
+
+#--------------------------------[Functions]-----------------------------------
+# Frame of size bytes, numbered so records can be told apart
+def frame(num, size=60):
+    return num.to_bytes(4, 'big') + b'\x00' * (size - 4)
+
+# A capture that got no packets can still be read, and merged with others
+def test_empty_capture(tmp_path):
+    empty = str(tmp_path / 'empty.pcap')
+    CapWriter(empty).close()
+    reader = CapReader(empty)
+    assert reader.linktype == capfile.DLT_EN10MB
+    assert list(reader) == []
+    reader.close()
+
+    full = str(tmp_path / 'full.pcap')
+    writer = CapWriter(full)
+    writer.write(frame(1), 10.5)
+    writer.close()
+
+    # A file left empty by an older capture is skipped as well
+    zero = str(tmp_path / 'zero.pcap')
+    open(zero, 'wb').close()
+
+    merged = str(tmp_path / 'merged.pcap')
+    assert merge_pcaps([[empty], [full], [zero]], merged) == 1
+    assert [data for sec, usec, wirelen, data in CapReader(merged)] == [frame(1)]
+
+# Numbers of the frames of each capture file
+def read_nums(paths):
+    return [[int.from_bytes(data[:4], 'big') for sec, usec, wirelen, data in CapReader(path)]
+            for path in paths]
+
+# Segments are closed before they would pass max_size, the oldest ones are
+# removed past the number to keep, and on_close hears of every segment
+def test_rotation_size(tmp_path):
+    closed = []
+    record = capfile.PCAP_RECORD.size + 60
+    writer = CapWriter(str(tmp_path / 'rot.pcap'), max_size=capfile.PCAP_HEADER.size + 3 * record,
+                       keep=2, on_close=closed.append)
+    for num in range(10):
+        writer.write(frame(num), 100.0 + num)
+    writer.close()
+
+    names = ['rot_000' + str(num) + '.pcap' for num in range(1, 5)]
+    assert closed == [str(tmp_path / name) for name in names]
+    assert writer.segments == closed[-2:]
+    assert sorted(os.listdir(tmp_path)) == names[-2:]
+    assert read_nums(writer.segments) == [[6, 7, 8], [9]]
+
+# Segments are closed once they are older than max_time, by poll() when no
+# packet comes
+def test_rotation_time(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(capfile.time, 'monotonic', lambda: now[0])
+
+    writer = CapWriter(str(tmp_path / 'rot.pcap'), max_time=60)
+    writer.write(frame(1), 100.0)
+    now[0] += 30
+    writer.write(frame(2), 130.0)
+    now[0] += 31
+    writer.poll()
+    writer.write(frame(3), 161.0)
+    writer.close()
+
+    assert read_nums(writer.segments) == [[1, 2], [3]]
+
+# Compressed captures read back the same as plain ones, also after a
+# second run appended to them, and keep the wire length of cut frames
+@pytest.mark.parametrize('compress', ['gzip', 'zstd'])
+def test_compressed_round_trip(tmp_path, compress):
+    if compress == 'zstd':
+        pytest.importorskip('zstandard')
+
+    path = str(tmp_path / 'comp.pcap')
+    for run in range(2):
+        writer = CapWriter(path, compress=compress, snaplen=40)
+        for num in range(100):
+            writer.write(frame(run * 100 + num, 60 + num), 100.0 + run * 100 + num)
+        writer.close()
+
+    assert writer.path == path + capfile.COMPRESS_EXT[compress]
+    assert not os.path.exists(path)
+    records = list(CapReader(writer.path))
+    assert [data for sec, usec, wirelen, data in records] == \
+        [frame(num, 60 + num % 100)[:40] for num in range(200)]
+    assert [wirelen for sec, usec, wirelen, data in records] == \
+        [60 + num % 100 for num in range(200)]
+    assert os.path.getsize(writer.path) < 200 * (capfile.PCAP_RECORD.size + 40)
+
+# Writes num packets four a second from ts 100, indexed every 10 packets
+def indexed_capture(path, count, compress=''):
+    writer = CapWriter(path, compress=compress, index=10)
+    for num in range(count):
+        writer.write(frame(num), 100.0 + num / 4)
+    writer.close()
+    return writer.path
+
+# The index has the first packet of every second and every 10th packet, and
+# seek_time() moves to the last one at or before the time
+@pytest.mark.parametrize('compress', ['', 'gzip'])
+def test_seek_time(tmp_path, compress):
+    path = indexed_capture(str(tmp_path / 'idx.pcap'), 100, compress)
+    entries = capfile.read_index(path)
+    assert [num for sec, usec, offset, num in entries] == \
+        sorted(set(range(0, 100, 4)) | set(range(0, 100, 10)))
+
+    reader = CapReader(path)
+    assert reader.seek_time(110.6) == 40
+    sec, usec, wirelen, data = next(reader)
+    assert (sec, usec, int.from_bytes(data[:4], 'big')) == (110, 0, 40)
+
+    # Never moves back, or before the first packet
+    assert reader.seek_time(105.0) is None
+    reader.close()
+    reader = CapReader(path)
+    assert reader.seek_time(99.0) is None
+    assert next(reader)[0] == 100
+    reader.close()
+
+# A capture without an index, or a partly written last entry, is read
+# without them
+def test_seek_time_partial_index(tmp_path):
+    path = indexed_capture(str(tmp_path / 'idx.pcap'), 20)
+    entries = capfile.read_index(path)
+    with open(capfile.index_path(path), 'r+b') as f:
+        f.truncate(os.path.getsize(capfile.index_path(path)) - 5)
+    assert capfile.read_index(path) == entries[:-1]
+
+    os.remove(capfile.index_path(path))
+    assert capfile.read_index(path) is None
+    assert CapReader(path).seek_time(104.0) is None
+
+# Times of the records of a capture
+def read_times(path):
+    return [sec + usec / 1000000 for sec, usec, wirelen, data in CapReader(path)]
+
+# The ring keeps the last max_secs seconds in memory, a trigger writes them
+# out and the next post seconds go straight to the capture
+def test_ring_trigger(tmp_path):
+    path = str(tmp_path / 'ring.pcap')
+    writer = CapWriter(path)
+    ring = CapRing(writer, max_secs=2, post=60)
+    for num in range(10):
+        ring.write(frame(num), 100.0 + num)
+    assert writer.pkts_written == 0
+
+    assert ring.trigger() == 3
+    ring.write(frame(10), 110.0)
+    # Already triggered, nothing more comes from memory
+    assert ring.trigger() is None
+    writer.close()
+
+    assert read_times(path) == [107.0, 108.0, 109.0, 110.0]
+    assert (ring.triggers, ring.dumped) == (1, 3)
+
+# Once the post-trigger time is over, records are kept in memory again
+def test_ring_rearms(tmp_path):
+    path = str(tmp_path / 'ring.pcap')
+    writer = CapWriter(path)
+    ring = CapRing(writer, max_bytes=200)
+    ring.write(frame(1), 100.0)
+    assert ring.trigger() == 1
+    for num in range(2, 8):
+        ring.write(frame(num), 100.0 + num)
+    writer.flush()
+    assert read_times(path) == [100.0]
+
+    # Only the records within max_bytes are left to write
+    assert ring.trigger() == 3
+    writer.close()
+    assert read_times(path) == [100.0, 105.0, 106.0, 107.0]
+
+# A rotating capture that got no packets keeps its first segment
+def test_empty_rotating_capture(tmp_path):
+    writer = CapWriter(str(tmp_path / 'rot.pcap'), max_size=1000)
+    writer.close()
+    assert writer.segments == [str(tmp_path / 'rot_0001.pcap')]
+    assert os.path.getsize(writer.segments[0]) == capfile.PCAP_HEADER.size
+#------------------------------------------------------------------------------
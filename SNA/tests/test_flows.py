@@ -0,0 +1,100 @@
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import random
+import struct
+
+# File imports
+import flows
+from flows import FlowCutoff, Sampler
+
+#--------------------------------[Functions]-----------------------------------
+# Ethernet/IPv4/UDP frame of one flow, padded to size bytes
+def udp_frame(sport, dport=53, size=100):
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, size - 14, 0, 0, 64, 17, 0,
+                     bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2]))
+    udp = struct.pack('!HHHH', sport, dport, size - 34, 0)
+    frame = b'\x11' * 6 + b'\x22' * 6 + b'\x08\x00' + ip + udp
+    return frame + b'\x00' * (size - len(frame))
+
+# Both directions of a flow share its key, other ports don't
+def test_flow_key():
+    frame = udp_frame(40000)
+    reply = frame[:26] + frame[30:34] + frame[26:30] + frame[36:38] + frame[34:36] + frame[38:]
+    assert flows.flow_key(frame) == flows.flow_key(reply)
+    assert flows.flow_key(frame) != flows.flow_key(udp_frame(40001))
+
+# Count sampling keeps exactly one in rate, starting with the first packet,
+# so the kept packets scaled by the rate give back the packets seen
+def test_sampler_count():
+    sampler = Sampler('Count', 10)
+    kept = [num for num in range(1000) if sampler.keep()]
+    assert kept == list(range(0, 1000, 10))
+    assert sampler.kept * sampler.rate == sampler.seen == 1000
+
+    sampler = Sampler('Count', 1)
+    assert all(sampler.keep() for num in range(10))
+
+# Random sampling keeps about one in rate
+def test_sampler_random():
+    random.seed(1)
+    sampler = Sampler('Random', 10)
+    for num in range(20000):
+        sampler.keep()
+    assert abs(sampler.kept * sampler.rate - 20000) < 1000
+
+# Flow sampling keeps every packet of about one in rate flows, in both
+# directions
+def test_sampler_flow():
+    sampler = Sampler('Flow', 4)
+    kept_flows = 0
+    for port in range(1000, 3000):
+        frame = udp_frame(port)
+        reply = frame[:26] + frame[30:34] + frame[26:30] + frame[36:38] + frame[34:36] + \
+            frame[38:]
+        kept = [sampler.keep(frame), sampler.keep(reply), sampler.keep(frame)]
+        assert kept in ([True] * 3, [False] * 3)
+        kept_flows += kept[0]
+    assert abs(kept_flows * sampler.rate - 2000) < 200
+
+# Packets past the packet or byte cutoff of their flow are counted, not
+# kept, and other flows are unaffected
+def test_cutoff():
+    cutoff = FlowCutoff(max_pkts=3)
+    kept = [cutoff.keep(udp_frame(40000), 100) for i in range(5)]
+    assert kept == [True, True, True, False, False]
+    assert cutoff.keep(udp_frame(40001), 100)
+    assert (cutoff.cut_pkts, cutoff.cut_bytes) == (2, 200)
+
+    # The packet that crosses the byte cutoff is still kept
+    cutoff = FlowCutoff(max_bytes=250)
+    kept = [cutoff.keep(udp_frame(40000), 100) for i in range(4)]
+    assert kept == [True, True, True, False]
+
+# A full table drops the flow idle the longest, so a busy flow keeps its
+# count while new flows come and go
+def test_cutoff_evicts_idle_flow(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(flows.time, 'monotonic', lambda: now[0])
+
+    cutoff = FlowCutoff(max_pkts=3, size=2)
+    busy = udp_frame(40000)
+    assert cutoff.keep(busy, 100)
+    for port in range(41000, 41010):
+        now[0] += 1
+        cutoff.keep(udp_frame(port), 100)
+        cutoff.keep(busy, 100)
+
+    assert not cutoff.keep(busy, 100)
+    assert len(cutoff.flows) == 2
+
+# A flow idle past the timeout starts over
+def test_cutoff_timeout(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(flows.time, 'monotonic', lambda: now[0])
+
+    cutoff = FlowCutoff(max_pkts=1, timeout=10)
+    assert cutoff.keep(udp_frame(40000), 100)
+    assert not cutoff.keep(udp_frame(40000), 100)
+    now[0] += 11
+    assert cutoff.keep(udp_frame(40000), 100)
+#------------------------------------------------------------------------------
@@ -0,0 +1,167 @@
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import random
+
+# File imports
+from capfile import split_ts
+import pcapstats
+
+#--------------------------------[Functions]-----------------------------------
+# Builds frames of the protocols the reports look at, with times that don't
+# fall on whole microseconds
+def make_frames(count):
+    pcapstats.load_scapy()
+    from scapy.layers.l2 import Ether, ARP
+    from scapy.layers.inet import IP, TCP, UDP, ICMP
+    from scapy.layers.inet6 import IPv6
+    from scapy.layers.dns import DNS, DNSQR, DNSRR
+    from scapy.packet import Raw
+
+    rand = random.Random(1)
+    frames = []
+    ts = 1700000000.0
+    for i in range(count):
+        ether = Ether(src='aa:bb:cc:00:00:%02x' % rand.randint(1, 5), dst='11:22:33:44:55:66')
+        ip = IP(src='10.0.0.%d' % rand.randint(1, 9), dst='10.0.1.%d' % rand.randint(1, 9))
+        kind = rand.randint(0, 5)
+        if kind == 0:
+            pkt = ether / ARP(psrc=ip.src, pdst=ip.dst, hwdst='11:22:33:44:55:66')
+        elif kind == 1:
+            pkt = ether / ip / UDP(sport=5353, dport=53) / \
+                DNS(qr=1, qd=DNSQR(qname='a.com'), an=DNSRR(rrname='a.com', rdata='10.9.9.9'))
+        elif kind == 2:
+            pkt = ether / ip / TCP(sport=40000, dport=443) / Raw(b'x' * 20)
+        elif kind == 3:
+            pkt = ether / ip / TCP(sport=40000, dport=80) / \
+                Raw(b'GET /a HTTP/1.1\r\nHost: h.com\r\n\r\n')
+        elif kind == 4:
+            pkt = ether / IPv6(src='fe80::%d' % rand.randint(1, 4), dst='fe80::9') / UDP()
+        else:
+            pkt = ether / ip / ICMP()
+
+        # Bursts and gaps, so the time bins aren't evenly filled
+        ts += rand.choice([0.0000004, 0.0012347, 0.2, 1.3])
+        frames.append((bytes(pkt), ts))
+
+    return frames
+
+# Rounds a time to the microseconds kept in a capture file
+def read_ts(ts):
+    sec, usec = split_ts(ts)
+    return (sec * 1000000 + usec) / 1000000
+
+# Counts frames the way pcapstats counts a capture read from disk. Returns
+# the keys and counts of every count report, and the keys and rows of every
+# time report.
+def offline_reports(frames):
+    pcapstats.load_reporting()
+    from scapy.layers.l2 import Ether
+
+    # Times as they are read back from the capture file
+    frames = [(raw, read_ts(ts)) for raw, ts in frames]
+    times = [ts for raw, ts in frames]
+    first, last = min(times), max(times)
+    per = (last - first) / 10
+    bins = [first + (per * i) for i in range(1, 11)]
+
+    table = pcapstats.PacketTable()
+    for raw, ts in frames:
+        counts, keys, ports = pcapstats.frame_keys(raw, Ether)
+        table.add(ts, len(raw), counts, keys, ports)
+    reports = pcapstats.register_reports(bins)
+    chunk = table.chunk()
+    for acc in reports:
+        acc.add(table, chunk)
+
+    counted = {}
+    timed = {}
+    for acc in reports:
+        keys = list(table.keys[acc.column])
+        if isinstance(acc, pcapstats.CountAccumulator):
+            counted[acc.name] = {key: count for key, count in zip(keys, acc.cnt.tolist())
+                                 if count > 0}
+        else:
+            timed[acc.name] = {key: row for key, row in zip(keys, acc.data.tolist())
+                               if sum(row) > 0}
+
+    return counted, timed, bins
+
+# The live stats count the same keys as pcapstats reading the capture, and
+# put them in the same time bins, apart from packets within one fine bin
+# of a bin edge
+def test_live_matches_offline():
+    frames = make_frames(400)
+    counted, timed, bins = offline_reports(frames)
+
+    from scapy.layers.l2 import Ether
+    stats = pcapstats.LiveStats()
+    for raw, ts in frames:
+        stats.add_frame(raw, ts, Ether)
+
+    near = sum(1 for raw, ts in frames if min(abs(ts - edge) for edge in bins) < stats.width)
+    for name, cnt in counted.items():
+        assert dict(stats.counts[name]) == cnt
+
+    for name, rows in timed.items():
+        live = {row[0]: row[1:] for row in stats._LiveStats__TimeData(name, bins)}
+        assert live.keys() == rows.keys()
+        moved = 0
+        for key, row in rows.items():
+            assert sum(live[key]) == sum(row)
+            moved += sum(abs(a - b) for a, b in zip(live[key], row))
+        assert moved <= 2 * near
+
+# The packet table keeps the wire length, ports and TCP flags scapy finds
+def test_table_columns():
+    frames = make_frames(200)
+    pcapstats.load_reporting()
+    from scapy.layers.l2 import Ether
+    from scapy.layers.inet import TCP, UDP
+
+    table = pcapstats.PacketTable()
+    for raw, ts in frames:
+        counts, keys, ports = pcapstats.frame_keys(raw, Ether)
+        table.add(ts, len(raw), counts, keys, ports)
+    chunk = table.chunk()
+
+    for row, (raw, ts) in enumerate(frames):
+        pkt = Ether(raw)
+        expected = (-1, -1, 0)
+        if TCP in pkt:
+            expected = (pkt[TCP].sport, pkt[TCP].dport, int(pkt[TCP].flags))
+        elif UDP in pkt:
+            expected = (pkt[UDP].sport, pkt[UDP].dport, 0)
+        assert chunk['length'][row] == len(raw)
+        assert (chunk['sport'][row], chunk['dport'][row], chunk['flags'][row]) == expected
+
+# The reports of a sampled capture are scaled up by its sampling rate
+def test_sampled_reports(tmp_path, monkeypatch, capsys):
+    from collections import Counter
+
+    monkeypatch.setattr(pcapstats, 'scale', 10)
+    monkeypatch.setattr(pcapstats, 'savepath', str(tmp_path), raising=False)
+    pcapstats.count_report("Protocols", "Protocol", '', Counter({'TCP': 7, 'UDP': 2}), 0)
+    rows = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert ['|', 'TCP', '|', '70', '|'] in rows
+    assert ['|', 'UDP', '|', '20', '|'] in rows
+
+    pcapstats.time_report("Protocols over time", "Protocol", 'time.png', [['TCP'] + [1] * 10],
+                          [float(num) for num in range(1, 11)])
+    rows = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert ['|', '0', '|', 'TCP'] + ['|', '10'] * 10 + ['|'] in rows
+
+# The fine bins of a long capture are widened, so memory doesn't grow with
+# the number of packets
+def test_live_bins_bounded():
+    from scapy.layers.l2 import Ether
+    raw = make_frames(1)[0][0]
+
+    stats = pcapstats.LiveStats()
+    for i in range(20000):
+        stats.add_frame(raw, 1700000000.0 + i * 7.3, Ether)
+
+    assert stats.packets == 20000
+    for keys in stats.times.values():
+        for fine_bins in keys.values():
+            assert len(fine_bins) <= pcapstats.LIVE_BINS + 1
+#------------------------------------------------------------------------------
@@ -0,0 +1,89 @@
+#---------------------------------[Imports]------------------------------------
+# Downloaded modules
+from scapy.layers.l2 import ARP, Dot1Q, Dot3, Ether, LLC
+from scapy.layers.inet import ICMP, IP, IPOption_NOP, TCP, UDP
+from scapy.layers.inet6 import IPv6, IPv6ExtHdrHopByHop
+from scapy.packet import NoPayload, Raw
+
+# File imports
+import pktheaders
+
+#--------------------------------[Functions]-----------------------------------
+# Names of the layers scapy dissects a frame into
+def scapy_layers(pkt):
+    names = []
+    while not isinstance(pkt, NoPayload):
+        names.append(pkt.name)
+        pkt = pkt.payload
+    return names
+
+# Frames the decoder handles, with payloads on ports scapy leaves raw
+def decoded_frames():
+    ether = Ether(src='aa:bb:cc:00:00:01', dst='11:22:33:44:55:66')
+    ip = IP(src='10.0.0.1', dst='10.0.1.2')
+    frames = [
+        ether / ip / TCP(sport=40000, dport=40001, flags='SA') / Raw(b'x' * 20),
+        ether / ip / TCP(sport=40000, dport=40001, flags='A', options=[('MSS', 1460)]),
+        ether / ip / UDP(sport=40000, dport=40001) / Raw(b'abc'),
+        ether / ip / ICMP(type=8) / Raw(b'ping'),
+        ether / ip / ICMP(type=0),
+        ether / ARP(psrc='10.0.0.1', pdst='10.0.0.2', hwdst='11:22:33:44:55:66'),
+        ether / IPv6(src='fe80::1', dst='2001:db8::2') / UDP(sport=40000, dport=40001),
+        ether / Dot1Q(vlan=5) / Dot1Q(vlan=6) / ip / TCP(sport=40000, dport=40001),
+        ether / IP(src='10.0.0.1', dst='10.0.1.2', flags=1, frag=0) / UDP(sport=40000, dport=40001),
+        ether / IP(src='10.0.0.1', dst='10.0.1.2', frag=5) / Raw(b'y' * 16),
+        ether / ip
+    ]
+    raws = [bytes(pkt) for pkt in frames]
+    # Ethernet padding of short frames, after UDP and after ARP
+    raws.append(bytes(ether / ip / UDP(sport=40000, dport=40001)) + b'\x00' * 10)
+    raws.append(bytes(frames[5]) + b'\x00' * 18)
+    return raws
+
+# The decoder finds the same layers and fields as scapy dissecting the frame
+def test_decode_matches_scapy():
+    for raw in decoded_frames():
+        hdr = pktheaders.decode(raw)
+        assert hdr is not None, raw.hex()
+        pkt = Ether(raw)
+
+        layers = list(hdr.layers)
+        if hdr.payload:
+            layers.append('Raw')
+        assert layers + ['Padding'] * hdr.pads == scapy_layers(pkt)
+        assert hdr.ether_src == pkt[Ether].src
+
+        if IP in pkt:
+            assert (hdr.src, hdr.dst, hdr.v6) == (pkt[IP].src, pkt[IP].dst, False)
+        elif IPv6 in pkt:
+            assert (hdr.src, hdr.dst, hdr.v6) == (pkt[IPv6].src, pkt[IPv6].dst, True)
+        else:
+            assert hdr.src is None
+        if ARP in pkt:
+            assert hdr.arp_psrc == pkt[ARP].psrc
+
+        if TCP in pkt:
+            l4 = pkt[TCP]
+            assert hdr.flags == int(l4.flags)
+        elif UDP in pkt:
+            l4 = pkt[UDP]
+        else:
+            assert hdr.l4 is None
+            continue
+        assert (hdr.l4, hdr.sport, hdr.dport) == (l4.name, l4.sport, l4.dport)
+        assert bytes(hdr.payload) == (pkt[Raw].load if Raw in pkt else b'')
+
+# Frames it doesn't dissect the way scapy does are left to scapy
+def test_decode_leaves_to_scapy():
+    ether = Ether(src='aa:bb:cc:00:00:01', dst='11:22:33:44:55:66')
+    frames = [
+        bytes(ether / IP(options=[IPOption_NOP()]) / TCP()),
+        bytes(ether / IPv6() / IPv6ExtHdrHopByHop() / UDP()),
+        bytes(Dot3(src='aa:bb:cc:00:00:01', dst='11:22:33:44:55:66') / LLC()),
+        bytes(ether / IP() / ICMP(type=3) / IP() / UDP()),
+        bytes(ether / IP() / TCP())[:40],
+        bytes(ether)[:10]
+    ]
+    for raw in frames:
+        assert pktheaders.decode(raw) is None, raw.hex()
+#------------------------------------------------------------------------------
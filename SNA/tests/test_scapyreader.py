@@ -0,0 +1,69 @@
+#---------------------------------[Imports]------------------------------------
+# Internal modules
+import socket
+import struct
+import time
+
+# Downloaded modules
+import pytest
+
+# File imports
+from capfile import CapRing, CapWriter
+import scapyreader
+
+#---------------------------------[Classes]------------------------------------
+# Stands in for a scapy socket, join_fanout() only uses its ins socket
+class FakeSocket:
+    def __init__(self, ins):
+        self.ins = ins
+
+#--------------------------------[Functions]-----------------------------------
+# The group id is the low 16 bits, hash mode and the defrag flag the high
+# 16, which is past INT_MAX
+def test_fanout_arg():
+    arg = scapyreader.fanout_arg(0x1234)
+    assert arg == struct.pack('I', 0x80001234)
+
+# Several packet sockets join the same group, the way the capture workers do
+def test_join_fanout():
+    try:
+        socks = [socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(3))
+                 for i in range(2)]
+    except (AttributeError, PermissionError):
+        pytest.skip("needs AF_PACKET sockets (Linux, root)")
+
+    try:
+        for sock in socks:
+            sock.bind(('lo', 3))
+            assert scapyreader.join_fanout(FakeSocket(sock), 0x1234)
+    finally:
+        for sock in socks:
+            sock.close()
+
+# Sockets that aren't packet sockets report the failure instead of raising
+def test_join_fanout_failure():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        assert not scapyreader.join_fanout(FakeSocket(sock), 0x1234)
+    assert not scapyreader.join_fanout(object(), 0x1234)
+
+# A fired trigger hands its message to notify instead of printing it, so it
+# can be shown on the dashboard
+def test_trigger_notifies(tmp_path, capsys):
+    writer = CapWriter(str(tmp_path / 'trig.pcap'))
+    ring = CapRing(writer, post=60)
+    ring.write(b'\x00' * 60, 100.0)
+
+    messages = []
+    trigger = scapyreader.CapTrigger('lo', ring, None, 0, lambda: 0, messages.append)
+    trigger.start()
+    trigger.event.set()
+    for i in range(50):
+        if messages:
+            break
+        time.sleep(0.1)
+    trigger.stop()
+    writer.close()
+
+    assert messages == ["Triggered by signal, saved 1 packets from memory."]
+    assert capsys.readouterr().out == ''
+#------------------------------------------------------------------------------